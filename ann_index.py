@@ -0,0 +1,226 @@
+import os
+import numpy as np
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest neighbour index over unit-length vectors,
+    written in plain NumPy.
+
+    Vectors are clustered with spherical k-means into nlist cells. A query is
+    compared against the cell centroids and only the nprobe closest cells are
+    scanned, so cost grows with nprobe / nlist of the corpus instead of all of it.
+    Raise nprobe for better recall, lower it for lower latency.
+
+    Every item has an id (the ResumeEmbeddings row id) and a label (the candidate
+    id) so whole candidates can be removed at once.
+
+    The index holds no copy of the vectors. bind() points it at the matrix that
+    does (the engine's rows, memory-mapped from the shared store) and each cell
+    keeps row positions into it, so the vectors stay in the page cache once for
+    every process. Call bind() again whenever that matrix changes.
+    """
+
+    def __init__(self, dim=384, nlist=None, nprobe=16, train_size=50000, iterations=10, seed=0):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_size = train_size
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = None
+        self.vectors = None
+        self.list_rows = []
+        self.list_ids = []
+        self.list_labels = []
+
+    def __len__(self):
+        return sum(len(ids) for ids in self.list_ids)
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def train(self, vectors):
+        """
+        Learn cell centroids from a sample of the vectors.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        rng = np.random.default_rng(self.seed)
+        if len(vectors) > self.train_size:
+            vectors = vectors[rng.choice(len(vectors), self.train_size, replace=False)]
+        nlist = self.nlist or max(1, int(4 * np.sqrt(len(vectors))))
+        nlist = min(nlist, len(vectors))
+
+        centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            assignment = self._assign(vectors, centroids)
+            order = np.argsort(assignment, kind="stable")
+            cells, starts = np.unique(assignment[order], return_index=True)
+            sums = np.zeros_like(centroids)
+            sums[cells] = np.add.reduceat(vectors[order], starts)
+            counts = np.bincount(assignment, minlength=nlist)
+            # Re-seed empty cells from random points so no centroid is wasted.
+            empty = counts == 0
+            if np.any(empty):
+                sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+            centroids = _normalize(sums)
+
+        self.nlist = nlist
+        self.centroids = centroids
+        self.list_rows = [np.empty(0, dtype=np.int64) for _ in range(nlist)]
+        self.list_ids = [np.empty(0, dtype=np.int64) for _ in range(nlist)]
+        self.list_labels = [np.empty(0, dtype=np.int64) for _ in range(nlist)]
+
+    def build(self, ids, labels, vectors):
+        """
+        Train on the vectors and add all of them.
+        """
+        self.train(vectors)
+        self.add(ids, labels, vectors)
+
+    def add(self, ids, labels, vectors):
+        """
+        Insert items into the cell nearest their vector. The index must be trained
+        first, and bound again before searching.
+        """
+        if not self.is_trained:
+            raise ValueError("Index must be trained before adding vectors")
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if len(vectors) == 0:
+            return
+        ids = np.asarray(ids, dtype=np.int64)
+        labels = np.asarray(labels, dtype=np.int64)
+        assignment = self._assign(vectors, self.centroids)
+        order = np.argsort(assignment, kind="stable")
+        cells, starts = np.unique(assignment[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        for cell, start, end in zip(cells, starts, ends):
+            rows = order[start:end]
+            self.list_rows[cell] = np.concatenate([self.list_rows[cell], np.full(len(rows), -1, dtype=np.int64)])
+            self.list_ids[cell] = np.concatenate([self.list_ids[cell], ids[rows]])
+            self.list_labels[cell] = np.concatenate([self.list_labels[cell], labels[rows]])
+
+    def remove(self, ids=None, labels=None):
+        """
+        Remove items by id and/or by label. Returns the number removed.
+        """
+        removed = 0
+        for cell in range(len(self.list_ids)):
+            drop = np.zeros(len(self.list_ids[cell]), dtype=bool)
+            if ids is not None:
+                drop |= np.isin(self.list_ids[cell], ids)
+            if labels is not None:
+                drop |= np.isin(self.list_labels[cell], labels)
+            if np.any(drop):
+                keep = ~drop
+                self.list_rows[cell] = self.list_rows[cell][keep]
+                self.list_ids[cell] = self.list_ids[cell][keep]
+                self.list_labels[cell] = self.list_labels[cell][keep]
+                removed += int(drop.sum())
+        return removed
+
+    def bind(self, vectors, row_ids):
+        """
+        Read vectors from rows of the given matrix, where row_ids holds the id of
+        each row. Every indexed id must be present.
+        """
+        order = np.argsort(row_ids, kind="stable")
+        sorted_ids = np.asarray(row_ids)[order]
+        for cell, ids in enumerate(self.list_ids):
+            self.list_rows[cell] = order[np.searchsorted(sorted_ids, ids)]
+        self.vectors = vectors
+
+    def all_ids(self):
+        if not self.list_ids:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(self.list_ids)
+
+    def search(self, query, k=10, nprobe=None):
+        """
+        Return (ids, labels, scores) of roughly the k most similar vectors, best first.
+        """
+        query = np.asarray(query, dtype=np.float32).ravel()
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        cell_scores = self.centroids @ query
+        if nprobe < self.nlist:
+            probe = np.argpartition(-cell_scores, nprobe - 1)[:nprobe]
+        else:
+            probe = np.arange(self.nlist)
+
+        ids, labels, scores = [], [], []
+        for cell in probe:
+            if len(self.list_ids[cell]):
+                ids.append(self.list_ids[cell])
+                labels.append(self.list_labels[cell])
+                scores.append(np.asarray(self.vectors[self.list_rows[cell]]) @ query)
+        if not ids:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0, dtype=np.float32)
+        ids, labels, scores = np.concatenate(ids), np.concatenate(labels), np.concatenate(scores)
+
+        if k < len(scores):
+            best = np.argpartition(-scores, k - 1)[:k]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return ids[best], labels[best], scores[best]
+
+    def save(self, path):
+        """
+        Write the index to a single .npz file, replacing any existing file atomically.
+        Vectors are not saved; bind the loaded index to the rows again.
+        """
+        sizes = np.array([len(ids) for ids in self.list_ids], dtype=np.int64)
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            params=np.array([self.dim, self.nlist, self.nprobe], dtype=np.int64),
+            centroids=self.centroids,
+            sizes=sizes,
+            ids=np.concatenate(self.list_ids),
+            labels=np.concatenate(self.list_labels)
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        dim, nlist, nprobe = (int(value) for value in data["params"])
+        index = cls(dim=dim, nlist=nlist, nprobe=nprobe)
+        index.centroids = data["centroids"]
+        splits = np.cumsum(data["sizes"])[:-1]
+        index.list_rows = [np.full(size, -1, dtype=np.int64) for size in data["sizes"]]
+        index.list_ids = np.split(data["ids"], splits)
+        index.list_labels = np.split(data["labels"], splits)
+        return index
+
+    @staticmethod
+    def _assign(vectors, centroids, block=8192):
+        # Blocked so the (rows x cells) score matrix stays small for large batches.
+        assignment = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), block):
+            assignment[start:start + block] = np.argmax(vectors[start:start + block] @ centroids.T, axis=1)
+        return assignment
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def recall_at_k(engine, queries, k=10, **search_options):
+    """
+    Average fraction of the exact top-k candidates that the approximate path
+    also returns, over a set of query embeddings. search_options (e.g. the
+    aggregation) apply to both searches.
+    """
+    recalls = []
+    for query in queries:
+        exact = {candidate_id for candidate_id, _ in engine.search(query, top_n=k, **{**search_options, "exact": True})}
+        if not exact:
+            continue
+        approx = {candidate_id for candidate_id, _ in engine.search(query, top_n=k, **search_options)}
+        recalls.append(len(exact & approx) / len(exact))
+    return float(np.mean(recalls)) if recalls else 1.0
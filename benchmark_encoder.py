@@ -0,0 +1,123 @@
+"""
+Encode throughput and numerical parity of the embedding backends.
+
+Usage:
+    python benchmark_encoder.py [--backends torch,torch-int8,onnx] [--texts resumes.txt]
+                                [--count 512] [--single 100] [--batch-size 32]
+
+Texts come from a file (one per line) or from search_eval's synthetic resume
+corpus. For every backend it reports single-query latency (one encode call per
+text, like a search), batch throughput in input order and batch throughput
+with EmbeddingBatcher's length bucketing (like ingest). For every backend
+other than torch it also reports cosine drift against torch: the mean, 1st
+percentile and minimum cosine between the two embeddings of each text, and
+how many of each text's 10 nearest neighbours are unchanged.
+"""
+import argparse
+import time
+import numpy as np
+from embedding_batcher import EmbeddingBatcher
+from model_registry import DEFAULT_MODEL, ModelRegistry, BACKENDS
+from search_eval import synthetic_corpus
+
+
+def load_texts(path, count):
+    if path:
+        with open(path, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        _, texts, _ = synthetic_corpus(max(count // 3, 1))
+    return texts[:count]
+
+
+def time_single(model, texts):
+    latencies = []
+    for text in texts:
+        start = time.perf_counter()
+        model.encode([text])
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000
+
+
+def time_batch(model, texts, batch_size):
+    start = time.perf_counter()
+    embeddings = model.encode(texts, batch_size=batch_size)
+    return embeddings, time.perf_counter() - start
+
+
+def time_bucketed(model, texts, batch_size):
+    batcher = EmbeddingBatcher(model, batch_size=batch_size)
+    for index, text in enumerate(texts):
+        batcher.add(index, [text])
+    batcher.run()
+    return batcher.stats
+
+
+def unit(vectors):
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def parity(reference, embeddings, k=10):
+    """
+    Cosine drift between two embeddings of the same texts, and the average
+    overlap of each text's k nearest neighbours under both.
+    """
+    reference, embeddings = unit(reference), unit(embeddings)
+    cosines = np.sum(reference * embeddings, axis=1)
+    k = min(k, len(reference) - 1)
+    overlap = 1.0
+    if k > 0:
+        def neighbours(vectors):
+            similarity = vectors @ vectors.T
+            np.fill_diagonal(similarity, -np.inf)
+            return np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+        expected, found = neighbours(reference), neighbours(embeddings)
+        overlap = float(np.mean([len(set(a) & set(b)) / k for a, b in zip(expected, found)]))
+    return {
+        "mean_cosine": float(cosines.mean()),
+        "p1_cosine": float(np.percentile(cosines, 1)),
+        "min_cosine": float(cosines.min()),
+        "neighbour_overlap@10": overlap,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends for speed and parity.")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--texts", help="File with one text per line (default: synthetic resume chunks)")
+    parser.add_argument("--count", type=int, default=512, help="Texts for the batch and parity runs")
+    parser.add_argument("--single", type=int, default=100, help="Texts for the single-query run")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    texts = load_texts(args.texts, args.count)
+    registry = ModelRegistry()
+    reference = None
+    print(f"{len(texts)} texts, model {args.model}\n")
+    print(f"{'backend':<12} {'load s':>7} {'p50 ms':>8} {'p95 ms':>8} {'texts/s':>9} {'bucket/s':>9} "
+          f"{'mean cos':>9} {'p1 cos':>8} {'min cos':>8} {'nn@10':>6}")
+    # torch is the parity reference, so it runs first.
+    for backend in sorted(args.backends.split(","), key=lambda backend: backend != "torch"):
+        try:
+            model = registry.get(args.model, backend)
+        except Exception as e:
+            print(f"{backend:<12} unavailable: {e}")
+            continue
+        model.encode(texts[:8])  # warm-up
+        single = time_single(model, texts[:args.single])
+        embeddings, elapsed = time_batch(model, texts, args.batch_size)
+        bucketed = time_bucketed(model, texts, args.batch_size)
+        if backend == "torch":
+            reference = embeddings
+        drift = parity(reference, embeddings) if reference is not None and backend != "torch" else None
+        line = (f"{backend:<12} {model.load_seconds:>7.1f} {np.percentile(single, 50):>8.2f} "
+                f"{np.percentile(single, 95):>8.2f} {len(texts) / elapsed:>9.1f} {bucketed['chunks_per_sec']:>9.1f}")
+        if drift:
+            line += (f" {drift['mean_cosine']:>9.5f} {drift['p1_cosine']:>8.5f} {drift['min_cosine']:>8.5f}"
+                     f" {drift['neighbour_overlap@10']:>6.3f}")
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Micro-benchmarks for the search engine on a synthetic corpus.
+
+Usage:
+    python benchmark_search.py [--chunks 200000] [--candidates 40000] [--queries 50] [--spread 1.0]
+                               [--shards N] [--section-rows 1.0]
+
+Reports queries/sec and chunks scored/sec for every aggregation mode, the
+speed and recall@10 of two-stage centroid search against the exact path, how
+exact scans scale from 1 to N shards, and what typed section rows (skills,
+experience, education) cost: unweighted searches skip them, searches that opt
+in with section_weights scan them.
+"""
+import argparse
+import os
+import time
+import numpy as np
+from search_engine import SearchEngine, AGGREGATIONS, SECTIONS
+from ann_index import recall_at_k
+
+
+def synthetic_engine(num_chunks, num_candidates, dim=384, seed=0, spread=None):
+    """
+    Build an engine over random vectors with chunks spread randomly over
+    num_candidates candidates. With a spread, each candidate's chunks scatter
+    around a random profile vector by that much noise, like sections of one
+    resume; without one every chunk is independent.
+    """
+    rng = np.random.default_rng(seed)
+    candidate_ids = np.sort(rng.integers(0, num_candidates, num_chunks))
+    embeddings = rng.standard_normal((num_chunks, dim), dtype=np.float32)
+    if spread is not None:
+        profiles = rng.standard_normal((num_candidates, dim), dtype=np.float32)
+        embeddings = profiles[candidate_ids] + spread * embeddings
+    engine = SearchEngine(dim=dim)
+    engine.add(candidate_ids, embeddings, np.arange(1, num_chunks + 1))
+    return engine
+
+
+def time_queries(search, queries):
+    start = time.perf_counter()
+    for query in queries:
+        search(query)
+    return time.perf_counter() - start
+
+
+def benchmark_aggregations(engine, queries, top_n=10):
+    print(f"{'aggregation':<12} {'queries/s':>10} {'chunks/s':>14} {'ms/query':>10}")
+    for aggregation in AGGREGATIONS:
+        elapsed = time_queries(lambda query: engine.search(query, top_n=top_n, aggregation=aggregation), queries)
+        qps = len(queries) / elapsed
+        print(f"{aggregation:<12} {qps:>10.1f} {qps * len(engine):>14,.0f} {1000 / qps:>10.2f}")
+
+
+def benchmark_two_stage(engine, queries, shortlists=(300, 1000, 3000), k=10):
+    """
+    Exact search against centroid shortlisting at several shortlist sizes.
+    """
+    exact_time = time_queries(lambda query: engine.search(query, top_n=k, exact=True), queries)
+    print(f"{'path':<16} {'queries/s':>10} {'rows/query':>11} {'recall@' + str(k):>10}")
+    print(f"{'exact':<16} {len(queries) / exact_time:>10.1f} {len(engine):>11,} {1.0:>10.3f}")
+    chunks_per_candidate = len(engine) / max(engine.num_candidates, 1)
+    for shortlist in shortlists:
+        engine.use_centroids(shortlist)
+        elapsed = time_queries(lambda query: engine.search(query, top_n=k), queries)
+        rows = engine.num_candidates + min(shortlist, engine.num_candidates) * chunks_per_candidate
+        recall = recall_at_k(engine, queries, k)
+        print(f"{'centroids/' + str(shortlist):<16} {len(queries) / elapsed:>10.1f} {rows:>11,.0f} {recall:>10.3f}")
+    engine.centroid_shortlist = engine.centroids = None
+
+
+def benchmark_shards(engine, queries, max_shards, top_n=10):
+    """
+    Exact-scan throughput with 1, 2, 4, ... up to max_shards parallel shards.
+    """
+    counts = sorted({2 ** i for i in range(max_shards.bit_length()) if 2 ** i <= max_shards} | {max_shards})
+    print(f"{'shards':<8} {'queries/s':>10} {'speedup':>8}")
+    baseline = None
+    for shards in counts:
+        engine.set_shards(shards)
+        elapsed = time_queries(lambda query: engine.search(query, top_n=top_n, exact=True), queries)
+        baseline = baseline or elapsed
+        print(f"{shards:<8} {len(queries) / elapsed:>10.1f} {baseline / elapsed:>7.2f}x")
+    engine.set_shards(1)
+
+
+def with_sections(engine, rows_per_chunk, seed=2):
+    """
+    A copy of engine plus about rows_per_chunk typed section rows per resume
+    chunk, each a noisy copy of one of its candidate's chunks.
+    """
+    rng = np.random.default_rng(seed)
+    count = int(len(engine) * rows_per_chunk)
+    sources = np.sort(rng.integers(0, len(engine), count))
+    noise = 0.5 * rng.standard_normal((count, engine.dim), dtype=np.float32) / np.sqrt(engine.dim)
+    sections = rng.integers(1, len(SECTIONS), count).astype(np.int8)
+    extended = SearchEngine(dim=engine.dim)
+    extended.add(np.concatenate([engine.candidate_ids, engine.candidate_ids[sources]]),
+                 np.concatenate([engine.matrix, engine.matrix[sources] + noise]),
+                 np.arange(1, len(engine) + count + 1),
+                 np.concatenate([engine.sections, sections]))
+    return extended
+
+
+def benchmark_sections(engine, queries, rows_per_chunk, k=10):
+    """
+    Unweighted exact search over resume chunks only against the same corpus
+    with typed section rows, which unweighted searches should skip (top k kept
+    1.000), and the cost of opting in to every section with section_weights.
+    """
+    extended = with_sections(engine, rows_per_chunk)
+    every_section = {name: 1.0 for name in SECTIONS}
+    print(f"{'aggregation':<12} {'rows':>10} {'ms/query':>9} {'+sections':>10} {'ms/query':>9} "
+          f"{'top-' + str(k) + ' kept':>11} {'opt-in ms':>10}")
+    for aggregation in AGGREGATIONS:
+        times, rankings = [], []
+        for target in (engine, extended):
+            results = []
+            elapsed = time_queries(lambda query: results.append(
+                {candidate_id for candidate_id, _ in target.search(query, top_n=k, exact=True,
+                                                                    aggregation=aggregation)}), queries)
+            times.append(1000 * elapsed / len(queries))
+            rankings.append(results)
+        kept = np.mean([len(a & b) / max(len(a), 1) for a, b in zip(*rankings)])
+        mixed = time_queries(lambda query: extended.search(query, top_n=k, section_weights=every_section), queries)
+        print(f"{aggregation:<12} {len(engine):>10,} {times[0]:>9.2f} {len(extended):>10,} {times[1]:>9.2f} "
+              f"{kept:>11.3f} {1000 * mixed / len(queries):>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark semantic search scoring.")
+    parser.add_argument("--chunks", type=int, default=200000)
+    parser.add_argument("--candidates", type=int, default=40000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--spread", type=float, default=1.0,
+                        help="Noise of chunks around their candidate's profile vector")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 1,
+                        help="Largest shard count in the scaling benchmark")
+    parser.add_argument("--section-rows", type=float, default=1.0,
+                        help="Typed section rows per resume chunk in the sections benchmark")
+    args = parser.parse_args()
+
+    engine = synthetic_engine(args.chunks, args.candidates, spread=args.spread)
+    rng = np.random.default_rng(1)
+    # Queries resemble stored chunks, as real queries resemble resume text.
+    queries = engine.matrix[rng.integers(0, len(engine), args.queries)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape, dtype=np.float32)
+    print(f"{len(engine):,} chunks, {engine.num_candidates:,} candidates, {args.queries} queries\n")
+    benchmark_aggregations(engine, queries)
+    print()
+    benchmark_two_stage(engine, queries)
+    print()
+    benchmark_shards(engine, queries, args.shards)
+    print()
+    benchmark_sections(engine, queries, args.section_rows)
+
+
+if __name__ == "__main__":
+    main()
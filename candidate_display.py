@@ -3,8 +3,6 @@ from candidate import Candidate
 import time
 from database_operations import *
 
-connection = create_connection()
-cursor = connection.cursor()
 def display_candidate_info(candidate):
     """
     Display a styled, clickable card for the candidate with their information.
@@ -1,12 +1,14 @@
 import json
 from datetime import datetime
 import streamlit as st
-from crewai import Agent, Task, Crew, LLM
 import os
 
 
 @st.cache_resource
 def create_agents():
+    # crewai pulls in the whole LLM stack, so it is only imported once a resume
+    # is actually processed.
+    from crewai import Agent, LLM
     os.environ['GROQ_API_KEY'] = "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"
 
     llm = LLM(
@@ -27,6 +29,7 @@ def create_agents():
 
 
 def create_single_task(agent, resume_text):
+    from crewai import Task
     return Task(
         description=f"""Extract all required information from this resume:
         {resume_text}
@@ -110,6 +113,7 @@ def save_json_sections(data):
 
 
 def process_resume(resume_text):
+    from crewai import Crew
     try:
         # Create single agent and task
         agents = create_agents()
@@ -3,6 +3,7 @@ import mysql.connector
 from mysql.connector import Error
 from dateutil.relativedelta import relativedelta
 import datetime
+from embedding_format import encode_embedding, decompress_chunk_text
 
 @st.cache_resource
 def create_connection():
@@ -66,7 +67,11 @@ def create_tables(connection):
         """CREATE TABLE IF NOT EXISTS ResumeEmbeddings (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             candidate_id INTEGER NOT NULL,
-            embedding TEXT NOT NULL,
+            embedding TEXT,  -- legacy comma-joined format, NULL once migrated
+            embedding_blob BLOB,  -- packed format, see embedding_format.py
+            section VARCHAR(16),  -- resume / skills / experience / education, NULL means resume
+            chunk_index INTEGER,  -- position of the chunk within its section
+            chunk_text BLOB,  -- zlib-compressed chunk text, shown as a match snippet
             FOREIGN KEY (candidate_id) REFERENCES Candidates(candidate_id) ON DELETE CASCADE
         )""",
         """CREATE TABLE CandidateFeedback (
@@ -118,6 +123,71 @@ def fetch_candidate_details(connection, candidate_id):
     cursor.close()
     return record
 
+def fetch_candidates_details(connection, candidate_ids):
+    """
+    Bulk version of fetch_candidate_details for a list of candidate ids.
+    Runs one query for Candidates and one per child table, whatever the number
+    of ids, instead of a three-way join per candidate. Returns the records in
+    the order of candidate_ids, skipping ids that no longer exist.
+    """
+    candidate_ids = [int(candidate_id) for candidate_id in candidate_ids]
+    if not candidate_ids:
+        return []
+    placeholders = ", ".join(["%s"] * len(candidate_ids))
+    cursor = connection.cursor(dictionary=True)
+
+    cursor.execute(
+        f"""SELECT candidate_id, name, email, phone_number, location
+            FROM Candidates WHERE candidate_id IN ({placeholders})""",
+        candidate_ids
+    )
+    records = {row['candidate_id']: dict(row, education=None, work_experience=None, skills=None)
+               for row in cursor.fetchall()}
+
+    # Each child table is aggregated on its own, so rows are never multiplied
+    # by a join across tables.
+    child_queries = [
+        ('education', f"""
+            SELECT candidate_id, GROUP_CONCAT(DISTINCT
+                CONCAT(degree, ' from ', institution, ' (', graduation_year, ')')
+                SEPARATOR '; ') AS value
+            FROM Education WHERE candidate_id IN ({placeholders}) GROUP BY candidate_id"""),
+        ('work_experience', f"""
+            SELECT candidate_id, GROUP_CONCAT(DISTINCT
+                CONCAT(position, ' at ', company, ' (', years_experience, ' years), desc', description)
+                SEPARATOR '; ') AS value
+            FROM WorkExperience WHERE candidate_id IN ({placeholders}) GROUP BY candidate_id"""),
+        ('skills', f"""
+            SELECT candidate_id, GROUP_CONCAT(DISTINCT CONCAT(skill_name, ' ') SEPARATOR '; ') AS value
+            FROM Skills WHERE candidate_id IN ({placeholders}) GROUP BY candidate_id"""),
+    ]
+    for field, query in child_queries:
+        cursor.execute(query, candidate_ids)
+        for row in cursor.fetchall():
+            if row['candidate_id'] in records:
+                records[row['candidate_id']][field] = row['value']
+    cursor.close()
+
+    return [records[candidate_id] for candidate_id in candidate_ids if candidate_id in records]
+
+def fetch_chunk_snippets(connection, chunk_ids):
+    """
+    Fetch the text of many resume chunks in one query.
+    Returns {ResumeEmbeddings.id: chunk text}; chunks stored without text are omitted.
+    """
+    chunk_ids = [int(chunk_id) for chunk_id in chunk_ids if chunk_id is not None and chunk_id >= 0]
+    if not chunk_ids:
+        return {}
+    placeholders = ", ".join(["%s"] * len(chunk_ids))
+    cursor = connection.cursor()
+    cursor.execute(
+        f"SELECT id, chunk_text FROM ResumeEmbeddings WHERE id IN ({placeholders}) AND chunk_text IS NOT NULL",
+        chunk_ids
+    )
+    snippets = {chunk_id: decompress_chunk_text(chunk_text) for chunk_id, chunk_text in cursor.fetchall()}
+    cursor.close()
+    return snippets
+
 def fetch_detailed_candidates(connection):
     cursor = connection.cursor(dictionary=True)
     cursor.execute("USE ResumeDatabase;")
@@ -358,10 +428,10 @@ def update_resume_embedding(embedding_id, candidate_id, embedding):
     try:
         query = """
             UPDATE ResumeEmbeddings
-            SET candidate_id = %s, embedding = %s
+            SET candidate_id = %s, embedding_blob = %s, embedding = NULL
             WHERE id = %s
         """
-        cursor.execute(query, (candidate_id, embedding, embedding_id))
+        cursor.execute(query, (candidate_id, encode_embedding(embedding), embedding_id))
         conn.commit()
         st.success("Resume embedding updated successfully!")
     except mysql.connector.Error as err:
@@ -0,0 +1,104 @@
+import time
+import numpy as np
+
+
+class EmbeddingBatcher:
+    """
+    Encode texts from many owners (resumes, chunk rows, ...) together.
+
+    Texts are collected with add(), sorted by token length and encoded in
+    batches of similar length, so short skills lists are not padded up to the
+    length of a 256-token experience description in the same batch. A batch
+    holds at most batch_size texts and at most max_batch_tokens padded tokens.
+    run() scatters the vectors back to their owners and records throughput.
+    """
+
+    def __init__(self, model, batch_size=64, max_batch_tokens=8192):
+        self.model = model
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        # Row indices of each owner's texts, in the order they were added.
+        self.owners = {}
+        self.texts = []
+        self.lengths = []
+        self.stats = {}
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, owner, texts, lengths=None):
+        """
+        Queue texts for owner. lengths, if known (e.g. from TextChunker), are
+        their token counts including special tokens; otherwise run() measures.
+        """
+        rows = self.owners.setdefault(owner, [])
+        for index, text in enumerate(texts):
+            rows.append(len(self.texts))
+            self.texts.append(text)
+            self.lengths.append(lengths[index] if lengths is not None else None)
+
+    def token_lengths(self, texts):
+        """
+        Token count of each text as the model will see it (capped at its
+        max_seq_length); whitespace words when the model has no tokenizer.
+        """
+        tokenizer = getattr(self.model, "tokenizer", None)
+        if tokenizer is None:
+            return np.array([len(text.split()) + 2 for text in texts], dtype=np.int64)
+        max_length = getattr(self.model, "max_seq_length", None)
+        encoded = tokenizer(texts, add_special_tokens=True, truncation=max_length is not None,
+                            max_length=max_length)
+        return np.array([len(ids) for ids in encoded["input_ids"]], dtype=np.int64)
+
+    def batches(self, lengths):
+        """
+        Index arrays of the batches, shortest texts first.
+        """
+        order = np.argsort(lengths, kind="stable")
+        batches, start = [], 0
+        for end in range(1, len(order) + 1):
+            # Sorted ascending, so the last text of a batch sets its padded length.
+            padded = (end - start) * max(int(lengths[order[end - 1]]), 1)
+            full = end - start > self.batch_size or (padded > self.max_batch_tokens and end - start > 1)
+            if full:
+                batches.append(order[start:end - 1])
+                start = end - 1
+        if start < len(order):
+            batches.append(order[start:])
+        return batches
+
+    def run(self):
+        """
+        Encode everything added so far. Returns {owner: embeddings of its texts,
+        in the order they were added} and clears the queue.
+        """
+        if not self.texts:
+            return {}
+        start = time.perf_counter()
+        lengths = np.array([length if length is not None else -1 for length in self.lengths], dtype=np.int64)
+        unknown = np.flatnonzero(lengths < 0)
+        if len(unknown):
+            lengths[unknown] = self.token_lengths([self.texts[i] for i in unknown])
+        embeddings = None
+        padded_tokens = 0
+        batches = self.batches(lengths)
+        for batch in batches:
+            vectors = np.asarray(self.model.encode([self.texts[i] for i in batch], batch_size=len(batch)),
+                                 dtype=np.float32)
+            if embeddings is None:
+                embeddings = np.empty((len(self.texts), vectors.shape[1]), dtype=np.float32)
+            embeddings[batch] = vectors
+            padded_tokens += len(batch) * int(lengths[batch].max())
+        results = {owner: embeddings[rows] for owner, rows in self.owners.items()}
+        elapsed = time.perf_counter() - start
+
+        self.stats = {
+            "chunks": len(self.texts),
+            "batches": len(batches),
+            "seconds": elapsed,
+            "chunks_per_sec": len(self.texts) / elapsed if elapsed else 0.0,
+            # Share of encoded tokens that were real text rather than padding.
+            "padding_efficiency": float(lengths.sum()) / padded_tokens if padded_tokens else 1.0,
+        }
+        self.owners, self.texts, self.lengths = {}, [], []
+        return results
@@ -0,0 +1,72 @@
+import struct
+import zlib
+import numpy as np
+
+# Binary layout of a stored embedding:
+#   magic (2 bytes) | version (1 byte) | dtype code (1 byte) | dim (uint32) | packed values
+MAGIC = b"RE"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<2sBBI")
+
+DTYPE_CODES = {"float32": 1, "float16": 2}
+CODE_DTYPES = {code: np.dtype(name).newbyteorder("<") for name, code in DTYPE_CODES.items()}
+
+# Precision used for newly written embeddings. float16 halves storage again at a
+# small cost in precision; scores are always computed in float32.
+DEFAULT_DTYPE = "float32"
+
+
+def encode_embedding(embedding, dtype=DEFAULT_DTYPE):
+    """
+    Pack an embedding vector into the binary BLOB format.
+    """
+    if dtype not in DTYPE_CODES:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+    values = np.asarray(embedding, dtype=np.dtype(dtype).newbyteorder("<")).ravel()
+    return HEADER.pack(MAGIC, FORMAT_VERSION, DTYPE_CODES[dtype], len(values)) + values.tobytes()
+
+
+def decode_embedding(blob):
+    """
+    Unpack a BLOB written by encode_embedding into a float32 vector.
+    """
+    blob = bytes(blob)
+    magic, version, dtype_code, dim = HEADER.unpack_from(blob)
+    if magic != MAGIC:
+        raise ValueError("Not a packed embedding")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported embedding format version: {version}")
+    if dtype_code not in CODE_DTYPES:
+        raise ValueError(f"Unknown embedding dtype code: {dtype_code}")
+    values = np.frombuffer(blob, dtype=CODE_DTYPES[dtype_code], count=dim, offset=HEADER.size)
+    return values.astype(np.float32)
+
+
+def decode_text_embedding(text):
+    """
+    Parse the legacy comma-joined text format (optionally wrapped in brackets).
+    """
+    return np.array(text.strip().strip("[]").split(","), dtype=np.float32)
+
+
+def decode_stored_embedding(embedding_blob, embedding_text):
+    """
+    Decode a ResumeEmbeddings row, preferring the binary column and falling back
+    to the legacy text column for rows that have not been migrated yet.
+    """
+    if embedding_blob is not None:
+        return decode_embedding(embedding_blob)
+    return decode_text_embedding(embedding_text)
+
+
+def compress_chunk_text(text):
+    """
+    zlib-compress a chunk's text for the ResumeEmbeddings.chunk_text BLOB.
+    """
+    return zlib.compress(text.encode("utf-8"))
+
+
+def decompress_chunk_text(blob):
+    if blob is None:
+        return None
+    return zlib.decompress(bytes(blob)).decode("utf-8")
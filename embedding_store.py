@@ -0,0 +1,262 @@
+import fcntl
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+
+class EmbeddingStore:
+    """
+    Flat on-disk store of normalized chunk embeddings that many processes can
+    memory-map read-only.
+
+    Layout under path:
+        CURRENT                      name of the live generation directory
+        LOCK                         flock() target serializing writers
+        gen-000001/embeddings.f32    float32 rows, count x dim
+        gen-000001/candidate_ids.i64 candidate id per row
+        gen-000001/row_ids.i64       ResumeEmbeddings.id per row
+        gen-000001/sections.i8       section code per row (see search_engine.SECTIONS)
+        gen-000001/meta.json         dim, count and database high-water marks
+
+    Rows are appended in place and only become visible once meta.json is
+    replaced with the new count. Deletions and re-sorting write a whole new
+    generation which is swapped in atomically by replacing CURRENT, so readers
+    never see a half-written file. Rows are kept sorted by candidate id and
+    then section, which SearchEngine relies on for its group reductions.
+    Generations written before sections existed map every row to section 0.
+    """
+
+    FILES = (("embeddings.f32", np.float32), ("candidate_ids.i64", np.int64), ("row_ids.i64", np.int64),
+             ("sections.i8", np.int8))
+
+    def __init__(self, path, dim=384):
+        self.path = path
+        self.dim = dim
+        os.makedirs(path, exist_ok=True)
+        self._lock_file = open(os.path.join(path, "LOCK"), "a+")
+        self._lock_depth = 0
+        self._thread_lock = threading.RLock()
+        self.generation = None
+        self.meta = {}
+        self.matrix = np.empty((0, dim), dtype=np.float32)
+        self.candidate_ids = np.empty(0, dtype=np.int64)
+        self.row_ids = np.empty(0, dtype=np.int64)
+        self.sections = np.empty(0, dtype=np.int8)
+
+        with self.locked():
+            if not os.path.exists(os.path.join(path, "CURRENT")):
+                self._write_generation(self.matrix, self.candidate_ids, self.row_ids, self.sections,
+                                       {"last_id": 0, "last_tombstone_id": None})
+            self.reload()
+
+    def __len__(self):
+        return self.meta.get("count", 0)
+
+    @property
+    def last_id(self):
+        return self.meta["last_id"]
+
+    @property
+    def last_tombstone_id(self):
+        return self.meta["last_tombstone_id"]
+
+    @property
+    def state(self):
+        """
+        Changes whenever the visible contents change; cheap to compare.
+        """
+        return self.generation, len(self)
+
+    @contextmanager
+    def locked(self):
+        """
+        Hold the cross-process writer lock. Re-entrant within a process.
+        """
+        with self._thread_lock:
+            if self._lock_depth == 0:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def reload(self):
+        """
+        Re-map the live generation if another process changed it.
+        Returns True if the visible contents changed.
+        """
+        # A writer may remove an old generation between reading CURRENT and
+        # opening its files, so retry with the new name.
+        for attempt in range(3):
+            try:
+                with open(os.path.join(self.path, "CURRENT")) as f:
+                    generation = f.read().strip()
+                with open(os.path.join(self.path, generation, "meta.json")) as f:
+                    meta = json.load(f)
+                if (generation, meta["count"]) == self.state:
+                    self.meta = meta
+                    return False
+                self._map(generation, meta)
+                return True
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
+
+    def _map(self, generation, meta):
+        count = meta["count"]
+        directory = os.path.join(self.path, generation)
+        if count == 0:
+            matrix = np.empty((0, self.dim), dtype=np.float32)
+            candidate_ids = np.empty(0, dtype=np.int64)
+            row_ids = np.empty(0, dtype=np.int64)
+            sections = np.empty(0, dtype=np.int8)
+        else:
+            matrix = np.memmap(os.path.join(directory, "embeddings.f32"), dtype=np.float32,
+                               mode="r", shape=(count, self.dim))
+            candidate_ids = np.memmap(os.path.join(directory, "candidate_ids.i64"), dtype=np.int64,
+                                      mode="r", shape=(count,))
+            row_ids = np.memmap(os.path.join(directory, "row_ids.i64"), dtype=np.int64,
+                                mode="r", shape=(count,))
+            if os.path.exists(os.path.join(directory, "sections.i8")):
+                sections = np.memmap(os.path.join(directory, "sections.i8"), dtype=np.int8,
+                                     mode="r", shape=(count,))
+            else:
+                sections = np.zeros(count, dtype=np.int8)
+        self.generation = generation
+        self.meta = meta
+        self.matrix, self.candidate_ids, self.row_ids, self.sections = matrix, candidate_ids, row_ids, sections
+
+    def append(self, candidate_ids, embeddings, row_ids, sections=None, marks=None):
+        """
+        Append normalized embeddings. Rows are written in place when they keep the
+        store sorted by candidate id and section, otherwise a re-sorted generation
+        is written. marks, a (last_id, last_tombstone_id) pair, are recorded in the
+        same meta write that makes the rows visible.
+        """
+        candidate_ids = np.asarray(candidate_ids, dtype=np.int64)
+        if len(candidate_ids) == 0:
+            return
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(len(candidate_ids), self.dim)
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        if sections is None:
+            sections = np.zeros(len(candidate_ids), dtype=np.int8)
+        sections = np.asarray(sections, dtype=np.int8)
+        # Batches arrive in insert (row id) order, which interleaves sections;
+        # sorting them first keeps appends of new candidates in place.
+        order = np.lexsort((sections, candidate_ids))
+        candidate_ids, embeddings, row_ids, sections = (candidate_ids[order], embeddings[order], row_ids[order],
+                                                        sections[order])
+
+        with self.locked():
+            self.reload()
+            directory = os.path.join(self.path, self.generation)
+            in_order = not np.any(sort_keys_decrease(np.concatenate([self.candidate_ids[-1:], candidate_ids[:1]]),
+                                                     np.concatenate([self.sections[-1:], sections[:1]])))
+            # Generations from before sections existed are rewritten once in full.
+            if not os.path.exists(os.path.join(directory, "sections.i8")):
+                in_order = False
+            if not in_order:
+                matrix = np.concatenate([self.matrix, embeddings])
+                ids = np.concatenate([self.candidate_ids, candidate_ids])
+                rows = np.concatenate([self.row_ids, row_ids])
+                codes = np.concatenate([self.sections, sections])
+                order = np.lexsort((codes, ids))
+                self._write_generation(matrix[order], ids[order], rows[order], codes[order],
+                                       self._with_marks(self.meta, marks))
+                return
+
+            count = len(self)
+            for (name, dtype), values in zip(self.FILES, (embeddings, candidate_ids, row_ids, sections)):
+                with open(os.path.join(directory, name), "r+b") as f:
+                    # Drop anything a crashed writer left past the committed count.
+                    row_bytes = np.dtype(dtype).itemsize * (self.dim if name == "embeddings.f32" else 1)
+                    f.truncate(count * row_bytes)
+                    f.seek(0, os.SEEK_END)
+                    f.write(values.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._write_meta(directory, self._with_marks(dict(self.meta, count=count + len(candidate_ids)), marks))
+            self.reload()
+
+    def remove_candidates(self, candidate_ids, marks=None):
+        """
+        Drop every row of the given candidates by writing a compacted generation,
+        recording marks (see append) with it. Returns the number of rows removed.
+        """
+        with self.locked():
+            self.reload()
+            keep = ~np.isin(self.candidate_ids, np.asarray(candidate_ids, dtype=np.int64))
+            removed = len(keep) - int(keep.sum())
+            if removed:
+                self._write_generation(self.matrix[keep], self.candidate_ids[keep], self.row_ids[keep],
+                                       self.sections[keep], self._with_marks(self.meta, marks))
+            elif marks is not None:
+                self.set_marks(*marks)
+            return removed
+
+    def set_marks(self, last_id, last_tombstone_id):
+        """
+        Record the database high-water marks the store is in sync with.
+        """
+        with self.locked():
+            self.reload()
+            self._write_meta(os.path.join(self.path, self.generation),
+                             dict(self.meta, last_id=last_id, last_tombstone_id=last_tombstone_id))
+            self.reload()
+
+    @staticmethod
+    def _with_marks(meta, marks):
+        if marks is None:
+            return meta
+        last_id, last_tombstone_id = marks
+        return dict(meta, last_id=last_id, last_tombstone_id=last_tombstone_id)
+
+    def _write_meta(self, directory, meta):
+        tmp_path = os.path.join(directory, "meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(directory, "meta.json"))
+
+    def _write_generation(self, matrix, candidate_ids, row_ids, sections, meta):
+        number = int(self.generation.split("-")[1]) + 1 if self.generation else 1
+        generation = f"gen-{number:06d}"
+        directory = os.path.join(self.path, generation)
+        os.makedirs(directory, exist_ok=True)
+        for (name, dtype), values in zip(self.FILES, (matrix, candidate_ids, row_ids, sections)):
+            with open(os.path.join(directory, name), "wb") as f:
+                f.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        self._write_meta(directory, dict(meta, dim=self.dim, count=len(candidate_ids)))
+
+        tmp_path = os.path.join(self.path, "CURRENT.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(generation)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.path, "CURRENT"))
+
+        previous = self.generation
+        self.reload()
+        # Keep the previous generation for readers that are mid-reload; older ones
+        # can go. Existing memory maps stay valid after their files are unlinked.
+        for name in os.listdir(self.path):
+            if name.startswith("gen-") and name not in (generation, previous):
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+
+def sort_keys_decrease(candidate_ids, sections):
+    """
+    True wherever a row breaks the (candidate id, section) sort order relative
+    to the row before it.
+    """
+    previous_ids, ids = candidate_ids[:-1], candidate_ids[1:]
+    return (ids < previous_ids) | ((ids == previous_ids) & (sections[1:] < sections[:-1]))
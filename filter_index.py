@@ -0,0 +1,138 @@
+import threading
+import numpy as np
+from lexical_index import tokenize
+from id_window import IdWindow, fetch_new_rows
+
+
+class FilterIndex:
+    """
+    Posting-list indexes for structured search filters.
+
+    location tokens -> candidate ids, skill name -> candidate ids, and total
+    years of experience per candidate. resolve() intersects the posting lists
+    into a sorted array of allowed candidate ids, which SearchEngine uses to
+    score only those candidates' rows. refresh() pulls new rows by high-water
+    mark, with a trailing window of ids, like the other indexes.
+    """
+
+    def __init__(self):
+        self.location_postings = {}
+        self.skill_postings = {}
+        self.candidate_locations = {}
+        self.candidate_skills = {}
+        self.experience_years = {}
+        # Candidate ids sorted by total years, rebuilt lazily after changes.
+        self._by_years = None
+        self.candidate_window = IdWindow()
+        self.skill_window = IdWindow()
+        self.work_window = IdWindow()
+        self.tombstones = None
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def normalize_skill(skill_name):
+        return " ".join(skill_name.lower().split())
+
+    def add_location(self, candidate_id, location):
+        with self._lock:
+            tokens = set(tokenize(location))
+            for token in tokens:
+                self.location_postings.setdefault(token, set()).add(candidate_id)
+            self.candidate_locations.setdefault(candidate_id, set()).update(tokens)
+
+    def add_skill(self, candidate_id, skill_name):
+        if not skill_name:
+            return
+        with self._lock:
+            skill = self.normalize_skill(skill_name)
+            self.skill_postings.setdefault(skill, set()).add(candidate_id)
+            self.candidate_skills.setdefault(candidate_id, set()).add(skill)
+
+    def add_experience(self, candidate_id, years):
+        with self._lock:
+            self.experience_years[candidate_id] = self.experience_years.get(candidate_id, 0) + (years or 0)
+            self._by_years = None
+
+    def remove(self, candidate_ids):
+        with self._lock:
+            for candidate_id in candidate_ids:
+                for token in self.candidate_locations.pop(candidate_id, ()):
+                    self.location_postings[token].discard(candidate_id)
+                for skill in self.candidate_skills.pop(candidate_id, ()):
+                    self.skill_postings[skill].discard(candidate_id)
+                self.experience_years.pop(candidate_id, None)
+            self._by_years = None
+
+    def candidates_with_years(self, min_years):
+        with self._lock:
+            if self._by_years is None:
+                ids = np.fromiter(self.experience_years.keys(), dtype=np.int64, count=len(self.experience_years))
+                years = np.fromiter(self.experience_years.values(), dtype=np.float64, count=len(self.experience_years))
+                order = np.argsort(years, kind="stable")
+                self._by_years = (ids[order], years[order])
+            ids, years = self._by_years
+            return ids[np.searchsorted(years, min_years, side="left"):]
+
+    def refresh(self, connection):
+        """
+        Index candidates, skills and work experience added since the last refresh
+        and drop deleted candidates. Returns True if anything changed.
+        """
+        with self._lock:
+            cursor = connection.cursor()
+            changed = False
+            if self.tombstones is None:
+                cursor.execute("SELECT COALESCE(MAX(id), 0) FROM EmbeddingTombstones")
+                self.tombstones = IdWindow(cursor.fetchone()[0])
+            cursor.execute(
+                "SELECT id, candidate_id FROM EmbeddingTombstones WHERE id > %s ORDER BY id",
+                (self.tombstones.floor,)
+            )
+            tombstones = self.tombstones.new(cursor.fetchall())
+            if tombstones:
+                self.remove([candidate_id for _, candidate_id in tombstones])
+                changed = True
+
+            rows = fetch_new_rows(cursor, self.candidate_window, "Candidates", "candidate_id", ["location"])
+            for candidate_id, location in rows:
+                self.add_location(candidate_id, location)
+            changed = changed or bool(rows)
+
+            rows = fetch_new_rows(cursor, self.skill_window, "Skills", "skill_id", ["candidate_id", "skill_name"])
+            for _, candidate_id, skill_name in rows:
+                self.add_skill(candidate_id, skill_name)
+            changed = changed or bool(rows)
+
+            rows = fetch_new_rows(cursor, self.work_window, "WorkExperience", "work_id",
+                                  ["candidate_id", "years_experience"])
+            for _, candidate_id, years in rows:
+                self.add_experience(candidate_id, years)
+            changed = changed or bool(rows)
+            cursor.close()
+            return changed
+
+    def resolve(self, location=None, skills=(), min_years=None):
+        """
+        Return a sorted array of candidate ids matching every given filter, or
+        None if no filter is set (meaning all candidates are allowed).
+
+        location matches candidates whose location contains all of its words,
+        skills must all be present, and min_years is compared with the total
+        years across a candidate's work experience.
+        """
+        with self._lock:
+            postings = []
+            for token in set(tokenize(location or "")):
+                postings.append(self.location_postings.get(token, set()))
+            for skill in skills:
+                postings.append(self.skill_postings.get(self.normalize_skill(skill), set()))
+            if min_years:
+                postings.append(set(self.candidates_with_years(min_years).tolist()))
+            if not postings:
+                return None
+            # Intersect smallest first so the working set shrinks as fast as possible.
+            postings.sort(key=len)
+            allowed = set(postings[0])
+            for posting in postings[1:]:
+                allowed &= posting
+        return np.array(sorted(allowed), dtype=np.int64)
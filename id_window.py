@@ -0,0 +1,69 @@
+# Refreshes read this many ids below their high-water mark again, to catch rows
+# whose transaction committed after rows with higher ids had been read.
+REFRESH_WINDOW = 1000
+
+
+class IdWindow:
+    """
+    High-water mark on an AUTO_INCREMENT id that tolerates out-of-order commits.
+
+    Ids are handed out at insert time but rows only become visible at commit,
+    so a slow transaction (store_json ingests a whole resume in one) can commit
+    rows below a mark a refresh has already moved past. Refreshes therefore
+    look at every id above floor, the mark minus window, and skip the ids
+    already applied. A row is missed only if window more ids are handed out
+    while its transaction is still open.
+    """
+
+    def __init__(self, last_id=0, window=REFRESH_WINDOW):
+        self.last_id = last_id
+        self.window = window
+        self.seen = set()
+
+    @property
+    def floor(self):
+        return max(self.last_id - self.window, 0)
+
+    def unseen(self, ids):
+        return [row_id for row_id in ids if row_id not in self.seen]
+
+    def mark(self, ids):
+        """
+        Record ids as applied and advance the mark past them.
+        """
+        if ids:
+            self.last_id = max(self.last_id, max(ids))
+        floor = self.floor
+        self.seen = {row_id for row_id in self.seen if row_id > floor}
+        self.seen.update(row_id for row_id in ids if row_id > floor)
+
+    def new(self, rows):
+        """
+        The rows (id first) not applied before, marking them applied.
+        """
+        fresh = [row for row in rows if row[0] not in self.seen]
+        self.mark([row[0] for row in fresh])
+        return fresh
+
+
+def fetch_new_rows(cursor, window, table, key, columns, where=None):
+    """
+    Rows of table above window.floor that were not applied before, as
+    (key, *columns) sorted by key, marking them applied. Only ids are read for
+    the whole window; full rows are read just for the new ones. where is an
+    optional extra SQL condition on the rows.
+    """
+    condition = f" AND ({where})" if where else ""
+    cursor.execute(f"SELECT {key} FROM {table} WHERE {key} > %s{condition} ORDER BY {key}", (window.floor,))
+    fresh = window.unseen([row[0] for row in cursor.fetchall()])
+    if not fresh:
+        return []
+    cursor.execute(
+        f"SELECT {key}, {', '.join(columns)} FROM {table} "
+        f"WHERE {key} BETWEEN %s AND %s{condition} ORDER BY {key}",
+        (fresh[0], fresh[-1])
+    )
+    wanted = set(fresh)
+    rows = [row for row in cursor.fetchall() if row[0] in wanted]
+    window.mark([row[0] for row in rows])
+    return rows
@@ -1,7 +1,7 @@
 import os
 import json
 from database_operations import *
-from store_emeddings import insert_embeddings
+from store_emeddings import insert_embeddings, resume_sections
 from glob import glob
 
 
@@ -53,7 +53,7 @@ def store_json(text):
 
     insert_skills_data(cursor, candidate_id, skills_data)
 
-    insert_embeddings(candidate_id,text)
+    insert_embeddings(candidate_id, text, resume_sections(education_data, work_experience_data, skills_data))
 
     reset()
 
@@ -0,0 +1,184 @@
+import math
+import re
+import threading
+from collections import Counter
+import numpy as np
+from embedding_format import decompress_chunk_text
+from id_window import IdWindow, fetch_new_rows
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*(?:[.\-][a-z0-9+#]+)*")
+
+# Text columns indexed per candidate: (table, primary key, text columns, row
+# condition). Section rows of ResumeEmbeddings repeat the Skills, WorkExperience
+# and Education text already indexed from those tables, so only whole-resume
+# chunks are read from it.
+SOURCES = [
+    ("Skills", "skill_id", ["skill_name"], None),
+    ("WorkExperience", "work_id", ["position", "company", "description"], None),
+    ("Education", "education_id", ["degree", "institution"], None),
+    ("ResumeEmbeddings", "id", ["chunk_text"], "section IS NULL OR section = 'resume'"),
+]
+
+
+def tokenize(text):
+    """
+    Lowercase word tokens that keep terms like c++, c#, node.js and python3.11 whole.
+    """
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+def column_text(value):
+    # Resume chunk text is stored zlib-compressed; other columns are plain text.
+    if isinstance(value, (bytes, bytearray)):
+        return decompress_chunk_text(value)
+    return str(value)
+
+
+class BM25Index:
+    """
+    Incremental BM25 inverted index with one document per candidate.
+
+    Postings map each term to {candidate_id: term frequency}, so a query only
+    touches the postings of its own terms. Text is added per candidate as rows
+    arrive, and refresh() pulls new rows from the database by high-water mark
+    the same way SearchEngine.refresh does, re-reading a trailing window of ids
+    so rows committed out of id order are not lost (see id_window.IdWindow).
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.doc_lengths = {}
+        self.doc_terms = {}
+        self.total_length = 0
+        self.windows = {table: IdWindow() for table, _, _, _ in SOURCES}
+        self.tombstones = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def add(self, doc_id, text):
+        """
+        Add text to a candidate's document, creating it if needed.
+        """
+        tokens = tokenize(text)
+        if not tokens:
+            return
+        with self._lock:
+            for term, count in Counter(tokens).items():
+                docs = self.postings.setdefault(term, {})
+                docs[doc_id] = docs.get(doc_id, 0) + count
+            self.doc_terms.setdefault(doc_id, set()).update(tokens)
+            self.doc_lengths[doc_id] = self.doc_lengths.get(doc_id, 0) + len(tokens)
+            self.total_length += len(tokens)
+
+    def remove(self, doc_ids):
+        with self._lock:
+            for doc_id in doc_ids:
+                for term in self.doc_terms.pop(doc_id, ()):
+                    docs = self.postings[term]
+                    docs.pop(doc_id, None)
+                    if not docs:
+                        del self.postings[term]
+                self.total_length -= self.doc_lengths.pop(doc_id, 0)
+
+    def refresh(self, connection):
+        """
+        Index rows added since the last refresh and drop deleted candidates.
+        Returns True if anything changed.
+        """
+        with self._lock:
+            cursor = connection.cursor()
+            changed = False
+            if self.tombstones is None:
+                # Candidates deleted before the first load are already gone.
+                cursor.execute("SELECT COALESCE(MAX(id), 0) FROM EmbeddingTombstones")
+                self.tombstones = IdWindow(cursor.fetchone()[0])
+            cursor.execute(
+                "SELECT id, candidate_id FROM EmbeddingTombstones WHERE id > %s ORDER BY id",
+                (self.tombstones.floor,)
+            )
+            tombstones = self.tombstones.new(cursor.fetchall())
+            if tombstones:
+                self.remove([candidate_id for _, candidate_id in tombstones])
+                changed = True
+
+            for table, key, columns, where in SOURCES:
+                rows = fetch_new_rows(cursor, self.windows[table], table, key, ["candidate_id"] + columns, where)
+                for row in rows:
+                    self.add(row[1], " ".join(column_text(value) for value in row[2:] if value))
+                if rows:
+                    changed = True
+            cursor.close()
+            return changed
+
+    def score(self, query_text):
+        """
+        Return (candidate_ids, scores) for every candidate matching a query term.
+        """
+        with self._lock:
+            num_docs = len(self.doc_lengths)
+            if num_docs == 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            avg_length = self.total_length / num_docs
+            doc_parts, score_parts = [], []
+            for term in set(tokenize(query_text)):
+                docs = self.postings.get(term)
+                if not docs:
+                    continue
+                ids = np.fromiter(docs.keys(), dtype=np.int64, count=len(docs))
+                tf = np.fromiter(docs.values(), dtype=np.float32, count=len(docs))
+                lengths = np.fromiter((self.doc_lengths[doc_id] for doc_id in docs), dtype=np.float32, count=len(docs))
+                idf = math.log(1 + (num_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * lengths / avg_length)
+                doc_parts.append(ids)
+                score_parts.append(idf * tf * (self.k1 + 1) / (tf + norm))
+        if not doc_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        candidate_ids, inverse = np.unique(np.concatenate(doc_parts), return_inverse=True)
+        return candidate_ids, np.bincount(inverse, weights=np.concatenate(score_parts)).astype(np.float32)
+
+    def search(self, query_text, top_n=10, candidate_filter=None):
+        """
+        Return a list of (candidate_id, bm25_score) for the best top_n candidates,
+        optionally restricted to the candidate ids in candidate_filter.
+        """
+        candidate_ids, scores = self.score(query_text)
+        if candidate_filter is not None:
+            keep = np.isin(candidate_ids, candidate_filter)
+            candidate_ids, scores = candidate_ids[keep], scores[keep]
+        if len(scores) == 0:
+            return []
+        order = np.argsort(-scores, kind="stable")[:top_n]
+        return [(int(candidate_ids[i]), float(scores[i])) for i in order]
+
+
+def reciprocal_rank_fusion(rankings, weights=None, k=60):
+    """
+    Fuse ranked lists of (candidate_id, score) by weighted reciprocal rank.
+    Scores are scaled so a candidate ranked first in every list scores 1.0.
+    Returns a list of (candidate_id, fused_score), best first.
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, (candidate_id, _) in enumerate(ranking):
+            fused[candidate_id] = fused.get(candidate_id, 0.0) + weight / (k + rank + 1)
+    best_possible = sum(weights) / (k + 1)
+    return sorted(((candidate_id, score / best_possible) for candidate_id, score in fused.items()),
+                  key=lambda item: item[1], reverse=True)
+
+
+def weighted_fusion(vector_ranking, lexical_ranking, alpha=0.7):
+    """
+    Blend vector similarity with BM25 scaled to [0, 1] by the query's best BM25
+    score: alpha * vector + (1 - alpha) * lexical. Candidates missing from a
+    list contribute 0 for it.
+    """
+    top_lexical = max((score for _, score in lexical_ranking), default=0.0) or 1.0
+    fused = {candidate_id: alpha * score for candidate_id, score in vector_ranking}
+    for candidate_id, score in lexical_ranking:
+        fused[candidate_id] = fused.get(candidate_id, 0.0) + (1 - alpha) * score / top_lexical
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -1,10 +1,31 @@
 import streamlit as st
-from add_page import addPage
-from signupPage import signupPage
-from viewpage import viewPage
-from search_page import searchPage
-from account_page import accountPage
-from database_operations import create_tables,create_connection
+
+
+# Each page module is imported only when its page is opened, so the login page
+# does not pay for numpy, the search indexes or the resume parsing stack.
+def signupPage():
+    from signupPage import signupPage as page
+    page()
+
+
+def viewPage():
+    from viewpage import viewPage as page
+    page()
+
+
+def addPage():
+    from add_page import addPage as page
+    page()
+
+
+def searchPage():
+    from search_page import searchPage as page
+    page()
+
+
+def accountPage():
+    from account_page import accountPage as page
+    page()
 
 
 pages = st.navigation(
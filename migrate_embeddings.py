@@ -0,0 +1,184 @@
+"""
+Convert ResumeEmbeddings rows from the legacy comma-joined text format to the
+packed binary format in embedding_format.py.
+
+Deploy order: the new code writes and reads the embedding_blob, section,
+chunk_index and chunk_text columns, and inserts no longer fill the legacy
+embedding column. Ingest and search fail against an unmigrated table. So run
+the schema step first, against the database the old code is still serving:
+
+    python migrate_embeddings.py --schema-only
+
+It only adds nullable columns, relaxes NOT NULL and creates the
+EmbeddingTombstones table with the candidates_after_delete trigger that fills
+it (search refreshes read deletions from it), none of which the old code
+notices. Then deploy, then run it again without the flag to convert the existing
+rows (and drop the unused CandidateCentroids table). Rows are converted in small
+batches, each committed on its own, so the app keeps serving searches while the
+migration runs: the loader in search_page reads either format. Safe to stop and
+re-run; already converted rows are skipped.
+
+Usage:
+    python migrate_embeddings.py [--schema-only] [--batch-size 500] [--dtype float32] [--pause 0.1]
+"""
+import argparse
+import time
+from database_operations import *
+from embedding_format import encode_embedding, decode_text_embedding, DTYPE_CODES, DEFAULT_DTYPE
+
+
+def column_exists(cursor, table, column):
+    cursor.execute(
+        """SELECT COUNT(*) FROM information_schema.COLUMNS
+           WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s""",
+        (table, column)
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def column_nullable(cursor, table, column):
+    cursor.execute(
+        """SELECT IS_NULLABLE FROM information_schema.COLUMNS
+           WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s""",
+        (table, column)
+    )
+    return cursor.fetchone()[0] == "YES"
+
+
+def trigger_exists(cursor, trigger):
+    cursor.execute(
+        """SELECT COUNT(*) FROM information_schema.TRIGGERS
+           WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME = %s""",
+        (trigger,)
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def prepare_schema(connection):
+    """
+    Add the binary embedding, chunk and section columns and relax NOT NULL on
+    the text column. Every statement is a no-op on a table that is already
+    migrated. Rows written before chunk text was stored keep NULL there and
+    simply show no snippet; rows without a section are whole-resume chunks.
+    Also creates EmbeddingTombstones, the change log of deleted candidates that
+    the search indexes read on refresh, and the trigger that fills it. Only adds
+    to the schema, so it is safe to run while the previous version of the app
+    is still serving.
+    """
+    cursor = connection.cursor()
+    columns = [("embedding_blob", "BLOB NULL"), ("chunk_index", "INT NULL"), ("chunk_text", "BLOB NULL"),
+               ("section", "VARCHAR(16) NULL")]
+    for column, definition in columns:
+        if not column_exists(cursor, "ResumeEmbeddings", column):
+            cursor.execute(f"ALTER TABLE ResumeEmbeddings ADD COLUMN {column} {definition}")
+    # MODIFY rebuilds the table, so only run it while the column is still NOT NULL.
+    if not column_nullable(cursor, "ResumeEmbeddings", "embedding"):
+        cursor.execute("ALTER TABLE ResumeEmbeddings MODIFY embedding TEXT NULL")
+    cursor.execute(
+        """CREATE TABLE IF NOT EXISTS EmbeddingTombstones (
+            id INT PRIMARY KEY AUTO_INCREMENT,
+            candidate_id INT NOT NULL,
+            deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )"""
+    )
+    # MySQL does not fire triggers for cascaded deletes, so the trigger sits on
+    # Candidates rather than ResumeEmbeddings.
+    if not trigger_exists(cursor, "candidates_after_delete"):
+        cursor.execute(
+            """CREATE TRIGGER candidates_after_delete
+                AFTER DELETE ON Candidates
+                FOR EACH ROW
+                INSERT INTO EmbeddingTombstones (candidate_id) VALUES (OLD.candidate_id)"""
+        )
+    connection.commit()
+    cursor.close()
+
+
+def drop_unused_tables(connection):
+    """
+    Drop CandidateCentroids, which older versions wrote but nothing reads; the
+    search engine derives centroids from the rows it holds. Run after deploying.
+    """
+    cursor = connection.cursor()
+    cursor.execute("DROP TABLE IF EXISTS CandidateCentroids")
+    connection.commit()
+    cursor.close()
+
+
+def migrate_batch(connection, last_id, batch_size, dtype):
+    """
+    Convert the next batch of unconverted rows after last_id.
+    Returns (rows_converted, new_last_id); rows_converted is 0 when done.
+    """
+    cursor = connection.cursor()
+    cursor.execute(
+        """SELECT id, embedding FROM ResumeEmbeddings
+           WHERE id > %s AND embedding_blob IS NULL
+           ORDER BY id LIMIT %s""",
+        (last_id, batch_size)
+    )
+    rows = cursor.fetchall()
+    if not rows:
+        cursor.close()
+        return 0, last_id
+
+    updates = []
+    for row_id, embedding_str in rows:
+        try:
+            blob = encode_embedding(decode_text_embedding(embedding_str), dtype=dtype)
+        except Exception as e:
+            print(f"Skipping embedding {row_id}: {e}")
+            continue
+        updates.append((blob, row_id))
+
+    # Only clear the text column for rows whose blob was written in the same
+    # statement, so a reader never sees a row with neither format.
+    cursor.executemany(
+        "UPDATE ResumeEmbeddings SET embedding_blob = %s, embedding = NULL WHERE id = %s",
+        updates
+    )
+    connection.commit()
+    cursor.close()
+    return len(updates), rows[-1][0]
+
+
+def migrate(connection, batch_size=500, dtype=DEFAULT_DTYPE, pause=0.1):
+    prepare_schema(connection)
+    last_id = 0
+    total = 0
+    while True:
+        converted, next_id = migrate_batch(connection, last_id, batch_size, dtype)
+        if next_id == last_id:
+            break
+        last_id = next_id
+        total += converted
+        print(f"Converted {total} embeddings (up to id {last_id})")
+        # Give the live app room between batches.
+        time.sleep(pause)
+    drop_unused_tables(connection)
+    print(f"Migration complete: {total} embeddings converted")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate resume embeddings to the binary format.")
+    parser.add_argument("--schema-only", action="store_true",
+                        help="Only add the new columns; run before deploying the new code")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dtype", choices=sorted(DTYPE_CODES), default=DEFAULT_DTYPE)
+    parser.add_argument("--pause", type=float, default=0.1, help="Seconds to sleep between batches")
+    args = parser.parse_args()
+
+    connection = create_connection()
+    if connection is None:
+        print("Could not connect to the database")
+        exit(1)
+    if args.schema_only:
+        prepare_schema(connection)
+        print("Schema ready; deploy, then run again without --schema-only to convert rows")
+        return
+    migrate(connection, batch_size=args.batch_size, dtype=args.dtype, pause=args.pause)
+
+
+if __name__ == "__main__":
+    main()
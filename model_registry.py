@@ -0,0 +1,187 @@
+"""
+Process-wide registry of sentence embedding models.
+
+Every page and job asks the registry for a model instead of constructing its
+own, so each named model is loaded once per process, on first use, and shared
+by all sessions. Importing this module is cheap: sentence_transformers (and
+torch with it) is only imported when the first model is loaded.
+
+Inference backends (EMBEDDING_BACKEND, or ModelRegistry(backend=...)):
+    torch       SentenceTransformer as is (the reference)
+    torch-int8  Linear layers dynamically quantized to int8; CPU only
+    onnx        ONNX Runtime export via sentence-transformers' onnx backend;
+                needs the optimum[onnxruntime] extra
+Check a backend against torch with benchmark_encoder.py before switching:
+stored vectors and query vectors should come from numerically close models.
+"""
+import os
+import threading
+import time
+import numpy as np
+
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+# Intra-op threads for CPU inference, pinned once before the first model loads.
+# Defaults to every core; with search shards enabled (search_page.SEARCH_SHARDS)
+# set EMBEDDING_THREADS lower so encodes and shard scans do not oversubscribe.
+ENCODE_THREADS = int(os.environ.get("EMBEDDING_THREADS", 0)) or os.cpu_count() or 1
+BACKENDS = ("torch", "torch-int8", "onnx")
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+
+
+def _rss_bytes():
+    # Current resident set size, or None where /proc is not available.
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def weight_bytes(value):
+    """
+    Bytes of the tensors in a state_dict value, including the int8 weights
+    quantize_dynamic packs into tuples, which parameters() does not list.
+    """
+    if isinstance(value, dict):
+        return sum(weight_bytes(item) for item in value.values())
+    if isinstance(value, (tuple, list)):
+        return sum(weight_bytes(item) for item in value)
+    if hasattr(value, "element_size") and hasattr(value, "numel"):
+        return value.numel() * value.element_size()
+    return 0
+
+
+class EmbeddingModel:
+    """
+    A loaded model plus its load and encode statistics. encode() always returns
+    a float32 NumPy array, so callers never see tensors or float64.
+    parameter_bytes is the size of the model's weights as stored (int8 where
+    quantized), or None for backends whose weights live outside torch (onnx);
+    rss_delta_bytes covers those.
+    """
+
+    def __init__(self, name, model, load_seconds, parameter_bytes, rss_delta_bytes, backend="torch"):
+        self.name = name
+        self.backend = backend
+        self.model = model
+        self.load_seconds = load_seconds
+        self.parameter_bytes = parameter_bytes
+        self.rss_delta_bytes = rss_delta_bytes
+        self.encode_calls = 0
+        self.encoded_texts = 0
+        self.encode_seconds = 0.0
+
+    def encode(self, texts, **kwargs):
+        kwargs.setdefault("convert_to_tensor", False)
+        start = time.perf_counter()
+        embeddings = self.model.encode(texts, **kwargs)
+        self.encode_seconds += time.perf_counter() - start
+        self.encode_calls += 1
+        self.encoded_texts += 1 if isinstance(texts, str) else len(texts)
+        return np.asarray(embeddings, dtype=np.float32)
+
+    @property
+    def key(self):
+        """
+        Cache key for embeddings made by this model: the name, plus the backend
+        unless it is the torch reference.
+        """
+        return self.name if self.backend == "torch" else f"{self.name}@{self.backend}"
+
+    @property
+    def max_seq_length(self):
+        return self.model.max_seq_length
+
+    @property
+    def tokenizer(self):
+        return self.model.tokenizer
+
+    def stats(self):
+        return {
+            "backend": self.backend,
+            "load_seconds": self.load_seconds,
+            "parameter_bytes": self.parameter_bytes,
+            "rss_delta_bytes": self.rss_delta_bytes,
+            "encode_calls": self.encode_calls,
+            "encoded_texts": self.encoded_texts,
+            "encode_seconds": self.encode_seconds,
+        }
+
+
+class ModelRegistry:
+    """
+    Loads each (model name, backend) at most once, on first use, and hands out
+    the same EmbeddingModel to every caller. Thread-safe.
+    """
+
+    def __init__(self, num_threads=ENCODE_THREADS, backend=EMBEDDING_BACKEND):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown embedding backend: {backend}")
+        self.num_threads = num_threads
+        self.backend = backend
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def get(self, name=DEFAULT_MODEL, backend=None):
+        backend = backend or self.backend
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown embedding backend: {backend}")
+        model = self._models.get((name, backend))
+        if model is None:
+            with self._lock:
+                model = self._models.get((name, backend))
+                if model is None:
+                    model = self._models[(name, backend)] = self._load(name, backend)
+        return model
+
+    def encode(self, texts, name=DEFAULT_MODEL, backend=None, **kwargs):
+        return self.get(name, backend).encode(texts, **kwargs)
+
+    def loaded(self):
+        return [model.key for model in self._models.values()]
+
+    def stats(self):
+        """
+        {model key: backend, load time, memory footprint and encode counters}.
+        """
+        return {model.key: model.stats() for model in self._models.values()}
+
+    def _load(self, name, backend="torch"):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        torch.set_num_threads(self.num_threads)
+        rss_before = _rss_bytes()
+        start = time.perf_counter()
+        if backend == "onnx":
+            model = SentenceTransformer(name, device="cpu", backend="onnx")
+        else:
+            model = SentenceTransformer(name, device="cpu")
+        if backend == "torch-int8":
+            # Weights of every Linear layer are stored as int8 and activations are
+            # quantized on the fly; embeddings and layer norms stay float32.
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        load_seconds = time.perf_counter() - start
+        rss_after = _rss_bytes()
+        # ONNX Runtime holds the weights of the onnx backend, out of torch's sight.
+        parameter_bytes = weight_bytes(model.state_dict()) if backend != "onnx" else None
+        rss_delta = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+        if parameter_bytes is not None:
+            footprint = f"{parameter_bytes / 2 ** 20:.0f} MB of weights"
+        elif rss_delta is not None:
+            footprint = f"{rss_delta / 2 ** 20:.0f} MB resident"
+        else:
+            footprint = "size unknown"
+        print(f"Loaded embedding model {name} ({backend}) in {load_seconds:.1f}s ({footprint})")
+        return EmbeddingModel(name, model, load_seconds, parameter_bytes, rss_delta, backend)
+
+
+registry = ModelRegistry()
+
+
+def get_model(name=DEFAULT_MODEL, backend=None):
+    """
+    The shared model for name on the configured (or given) backend, loading it
+    on first use.
+    """
+    return registry.get(name, backend)
@@ -0,0 +1,75 @@
+"""
+Import-time profile of the app's page modules.
+
+Each module is imported in a fresh interpreter with `python -X importtime`, so
+the numbers include everything it pulls in, as on a cold server start.
+
+Usage:
+    python profile_imports.py [--modules search_page add_page ...] [--top 15] [--budget-ms 1500]
+
+The script exits non-zero if any module fails to import or, with --budget-ms,
+takes longer than the budget, so it can run in CI to catch broken imports and
+startup regressions.
+"""
+import argparse
+import subprocess
+import sys
+
+PAGE_MODULES = ["signupPage", "account_page", "viewpage", "add_page", "search_page"]
+
+
+def import_profile(module):
+    """
+    Return (total_ms, [(cumulative_ms, depth, imported module), ...]) for
+    importing module, or (None, error text) if the import failed. total_ms also
+    counts interpreter startup imports the module triggers first.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        return None, result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed"
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nesting shows as two extra spaces of indentation per level.
+        name = name[1:].rstrip()
+        imports.append((int(cumulative) / 1000, len(name) - len(name.lstrip()), name.strip()))
+    total = sum(ms for ms, depth, _ in imports if depth == 0)
+    return total, imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile import time of the app's page modules.")
+    parser.add_argument("--modules", nargs="+", default=PAGE_MODULES)
+    parser.add_argument("--top", type=int, default=15, help="Heaviest imports to list per module")
+    parser.add_argument("--budget-ms", type=float, help="Fail if any module takes longer than this to import")
+    args = parser.parse_args()
+
+    over_budget, failed = [], []
+    for module in args.modules:
+        total, imports = import_profile(module)
+        if total is None:
+            print(f"{module}: could not be imported ({imports})\n")
+            failed.append(module)
+            continue
+        print(f"{module}: {total:,.0f} ms")
+        # Direct imports of the module, heaviest first.
+        heaviest = sorted(((ms, name) for ms, depth, name in imports if depth == 2), reverse=True)[:args.top]
+        for ms, name in heaviest:
+            print(f"    {ms:>9,.1f} ms  {name}")
+        print()
+        if args.budget_ms is not None and total > args.budget_ms:
+            over_budget.append(module)
+
+    if failed:
+        print(f"Failed to import: {', '.join(failed)}")
+    if over_budget:
+        print(f"Over the {args.budget_ms:,.0f} ms budget: {', '.join(over_budget)}")
+    if failed or over_budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
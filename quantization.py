@@ -0,0 +1,141 @@
+import numpy as np
+
+
+class ScalarQuantizer:
+    """
+    Per-dimension int8 quantization. Each dimension is mapped linearly from its
+    observed [min, max] range onto 256 levels, cutting memory to a quarter of
+    float32.
+    """
+
+    name = "int8"
+
+    def __init__(self, dim=384):
+        self.dim = dim
+        self.offset = None
+        self.scale = None
+
+    @property
+    def is_trained(self):
+        return self.scale is not None
+
+    def train(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        low = vectors.min(axis=0)
+        high = vectors.max(axis=0)
+        self.scale = np.maximum(high - low, 1e-8) / 255.0
+        # Codes are stored as int8 in [-128, 127], so shift the range by 128 levels.
+        self.offset = low + 128.0 * self.scale
+
+    def encode(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        codes = np.rint((vectors - self.offset) / self.scale)
+        return np.clip(codes, -128, 127).astype(np.int8)
+
+    def decode(self, codes):
+        return codes.astype(np.float32) * self.scale + self.offset
+
+    def score(self, codes, query, block=65536):
+        """
+        Approximate dot products of the query with every encoded vector.
+        q . (c * scale + offset) = (q * scale) . c + q . offset
+        """
+        query = np.asarray(query, dtype=np.float32)
+        scaled_query = query * self.scale
+        bias = float(query @ self.offset)
+        scores = np.empty(len(codes), dtype=np.float32)
+        # Blocked so only one block of codes is widened to float32 at a time.
+        for start in range(0, len(codes), block):
+            scores[start:start + block] = codes[start:start + block].astype(np.float32) @ scaled_query
+        return scores + bias
+
+
+class ProductQuantizer:
+    """
+    Product quantization: the vector is split into m sub-vectors and each one is
+    replaced by the index of its nearest centroid in a 256-entry codebook trained
+    with k-means, so a 384-dim float32 vector shrinks to m bytes.
+    """
+
+    name = "pq"
+
+    def __init__(self, dim=384, m=48, train_size=50000, iterations=10, seed=0):
+        if dim % m:
+            raise ValueError("dim must be divisible by m")
+        self.dim = dim
+        self.m = m
+        self.sub_dim = dim // m
+        self.train_size = train_size
+        self.iterations = iterations
+        self.seed = seed
+        self.codebooks = None
+
+    @property
+    def is_trained(self):
+        return self.codebooks is not None
+
+    def train(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        rng = np.random.default_rng(self.seed)
+        if len(vectors) > self.train_size:
+            vectors = vectors[rng.choice(len(vectors), self.train_size, replace=False)]
+        ksub = min(256, len(vectors))
+        codebooks = np.zeros((self.m, 256, self.sub_dim), dtype=np.float32)
+        for j in range(self.m):
+            sub = vectors[:, j * self.sub_dim:(j + 1) * self.sub_dim]
+            centroids = sub[rng.choice(len(sub), ksub, replace=False)].copy()
+            for _ in range(self.iterations):
+                assignment = _nearest(sub, centroids)
+                order = np.argsort(assignment, kind="stable")
+                cells, starts, counts = np.unique(assignment[order], return_index=True, return_counts=True)
+                centroids[cells] = np.add.reduceat(sub[order], starts) / counts[:, None]
+            codebooks[j, :ksub] = centroids
+        self.codebooks = codebooks
+
+    def encode(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            sub = vectors[:, j * self.sub_dim:(j + 1) * self.sub_dim]
+            codes[:, j] = _nearest(sub, self.codebooks[j])
+        return codes
+
+    def decode(self, codes):
+        return self.codebooks[np.arange(self.m), codes].reshape(len(codes), self.dim)
+
+    def score(self, codes, query, block=65536):
+        """
+        Approximate dot products using a per-query lookup table of sub-vector scores.
+        """
+        query = np.asarray(query, dtype=np.float32).reshape(self.m, self.sub_dim)
+        table = np.einsum("mkd,md->mk", self.codebooks, query)
+        scores = np.empty(len(codes), dtype=np.float32)
+        columns = np.arange(self.m)
+        for start in range(0, len(codes), block):
+            scores[start:start + block] = table[columns, codes[start:start + block]].sum(axis=1)
+        return scores
+
+
+def _nearest(vectors, centroids, block=8192):
+    # Euclidean nearest centroid; ||c||^2 - 2 v.c ranks the same as ||v - c||^2.
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), block):
+        distances = centroid_norms - 2.0 * (vectors[start:start + block] @ centroids.T)
+        assignment[start:start + block] = np.argmin(distances, axis=1)
+    return assignment
+
+
+def memory_report(engine):
+    """
+    Bytes used by the full-precision matrix versus the quantized codes.
+    """
+    float_bytes = int(engine.matrix.nbytes)
+    code_bytes = int(engine.codes.nbytes) if engine.codes is not None else 0
+    return {
+        "chunks": len(engine),
+        "float32_bytes": float_bytes,
+        "quantized_bytes": code_bytes,
+        "saved_bytes": float_bytes - code_bytes,
+        "compression_ratio": float_bytes / code_bytes if code_bytes else 0.0
+    }
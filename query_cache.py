@@ -0,0 +1,153 @@
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+
+def normalize_query(query_text):
+    """
+    Collapse case and whitespace so trivially different queries share an entry.
+    """
+    return " ".join(query_text.lower().split())
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU cache of query embeddings with a time-to-live, keyed on the
+    model name and the normalized query text.
+
+    One instance is shared by every session in the process. If a path is given
+    the cache is loaded from it on start and written back every persist_every
+    new entries, so a restarted server starts warm.
+    """
+
+    def __init__(self, max_size=1024, ttl=24 * 3600, path=None, persist_every=20):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.persist_every = persist_every
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(query_text, model_name):
+        return f"{model_name}\x1f{normalize_query(query_text)}"
+
+    def get(self, query_text, model_name):
+        key = self.make_key(query_text, model_name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[1] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, query_text, model_name, embedding):
+        key = self.make_key(query_text, model_name)
+        embedding = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            self._entries[key] = (embedding, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._unsaved += 1
+            should_save = self.path and self._unsaved >= self.persist_every
+        if should_save:
+            self.save()
+
+    def get_or_compute(self, query_text, model_name, compute):
+        """
+        Return the cached embedding, or call compute(query_text) and cache the result.
+        """
+        embedding = self.get(query_text, model_name)
+        if embedding is None:
+            embedding = compute(query_text)
+            self.put(query_text, model_name, embedding)
+        return embedding
+
+    def get_or_compute_many(self, query_texts, model_name, compute_many):
+        """
+        Batched get_or_compute: all misses are passed to compute_many(texts) in a
+        single call, which should return one embedding per text.
+        """
+        embeddings = [self.get(text, model_name) for text in query_texts]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            computed = compute_many([query_texts[i] for i in missing])
+            for i, embedding in zip(missing, computed):
+                self.put(query_texts[i], model_name, embedding)
+                embeddings[i] = np.asarray(embedding, dtype=np.float32)
+        return np.stack(embeddings) if embeddings else np.empty((0, 0), dtype=np.float32)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+    def save(self):
+        """
+        Write the live entries to path, replacing the previous file atomically.
+        Saves are serialized under the cache lock and each writes its own
+        temporary file, so concurrent saves (or processes sharing the path)
+        cannot clobber each other. A failed write is logged, not raised: it
+        only costs warmth after a restart.
+        """
+        with self._lock:
+            now = time.time()
+            items = [(key, value) for key, value in self._entries.items() if now - value[1] <= self.ttl]
+            self._unsaved = 0
+            tmp_path = None
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=directory or ".", suffix=".npz")
+                with os.fdopen(fd, "wb") as f:
+                    np.savez(
+                        f,
+                        keys=np.array([key for key, _ in items], dtype=str),
+                        embeddings=np.stack([value[0] for _, value in items]) if items
+                        else np.empty((0, 0), dtype=np.float32),
+                        timestamps=np.array([value[1] for _, value in items], dtype=np.float64)
+                    )
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"Could not save query cache to {self.path}: {e}")
+                if tmp_path and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def load(self):
+        try:
+            data = np.load(self.path)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable query cache {self.path}: {e}")
+            return
+        # Each NpzFile lookup reads and decompresses the whole array, so read each once.
+        with data:
+            keys, embeddings, timestamps = data["keys"], data["embeddings"], data["timestamps"]
+        now = time.time()
+        with self._lock:
+            # Oldest first so the most recently used entries end up at the LRU tail.
+            for i in np.argsort(timestamps, kind="stable"):
+                if now - timestamps[i] <= self.ttl:
+                    self._entries[str(keys[i])] = (embeddings[i], float(timestamps[i]))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
@@ -0,0 +1,98 @@
+"""
+Re-encode every stored resume chunk with the current embedding model, e.g.
+after switching models or backends.
+
+Chunks are read back from ResumeEmbeddings.chunk_text in id batches and encoded
+with EmbeddingBatcher, which sorts them by token length so each encode batch is
+padded as little as possible. Each batch is committed on its own. Rows without
+stored chunk text (written before chunk text was kept) are skipped. Throughput
+is printed as chunks/sec per batch and overall.
+
+The search engine only pulls rows with new ids, so delete the embedding store
+(index/embeddings) and any saved ANN index afterwards to rebuild them from the
+new vectors.
+
+Usage:
+    python reembed_resumes.py [--batch-size 2000] [--encode-batch 64] [--max-batch-tokens 8192]
+                              [--model all-MiniLM-L6-v2] [--backend torch] [--pause 0.1]
+"""
+import argparse
+import time
+from database_operations import *
+from embedding_batcher import EmbeddingBatcher
+from embedding_format import encode_embedding, decompress_chunk_text
+from model_registry import DEFAULT_MODEL, BACKENDS, get_model
+
+
+def reembed_batch(connection, batcher, last_id, batch_size):
+    """
+    Re-encode the next batch of rows after last_id.
+    Returns (rows_updated, new_last_id); new_last_id == last_id when done.
+    """
+    cursor = connection.cursor()
+    cursor.execute(
+        """SELECT id, chunk_text FROM ResumeEmbeddings
+           WHERE id > %s AND chunk_text IS NOT NULL
+           ORDER BY id LIMIT %s""",
+        (last_id, batch_size)
+    )
+    rows = cursor.fetchall()
+    if not rows:
+        cursor.close()
+        return 0, last_id
+
+    for row_id, chunk in rows:
+        batcher.add(row_id, [decompress_chunk_text(chunk)])
+    embeddings = batcher.run()
+    cursor.executemany(
+        "UPDATE ResumeEmbeddings SET embedding_blob = %s, embedding = NULL WHERE id = %s",
+        [(encode_embedding(embeddings[row_id][0]), row_id) for row_id, _ in rows]
+    )
+    connection.commit()
+    cursor.close()
+    return len(rows), rows[-1][0]
+
+
+def reembed(connection, model, batch_size=2000, encode_batch=64, max_batch_tokens=8192, pause=0.1):
+    batcher = EmbeddingBatcher(model, encode_batch, max_batch_tokens)
+    last_id = 0
+    total = 0
+    seconds = 0.0
+    while True:
+        updated, next_id = reembed_batch(connection, batcher, last_id, batch_size)
+        if next_id == last_id:
+            break
+        last_id = next_id
+        total += updated
+        seconds += batcher.stats["seconds"]
+        print(f"Re-embedded {total} chunks (up to id {last_id}): "
+              f"{batcher.stats['chunks_per_sec']:.1f} chunks/sec, "
+              f"{batcher.stats['padding_efficiency']:.0%} of encoded tokens were text")
+        # Give the live app room between batches.
+        time.sleep(pause)
+    rate = total / seconds if seconds else 0.0
+    print(f"Re-embedding complete: {total} chunks, {rate:.1f} chunks/sec encoding")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-encode stored resume chunks with the current model.")
+    parser.add_argument("--batch-size", type=int, default=2000, help="Rows read and committed per batch")
+    parser.add_argument("--encode-batch", type=int, default=64, help="Most chunks per encode call")
+    parser.add_argument("--max-batch-tokens", type=int, default=8192,
+                        help="Most padded tokens per encode call")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--backend", choices=BACKENDS)
+    parser.add_argument("--pause", type=float, default=0.1, help="Seconds to sleep between batches")
+    args = parser.parse_args()
+
+    connection = create_connection()
+    if connection is None:
+        print("Could not connect to the database")
+        exit(1)
+    reembed(connection, get_model(args.model, args.backend), batch_size=args.batch_size,
+            encode_batch=args.encode_batch, max_batch_tokens=args.max_batch_tokens, pause=args.pause)
+
+
+if __name__ == "__main__":
+    main()
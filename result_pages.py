@@ -0,0 +1,112 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from query_cache import normalize_query
+
+
+def query_hash(query_text, **options):
+    """
+    Stable key for a query: the normalized text plus every option that changes
+    its ranking (mode, aggregation, filters, ...).
+    """
+    payload = json.dumps([normalize_query(query_text), options], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class RankedResults:
+    """
+    The full ranking for one query, computed once and then served page by page.
+
+    A ranking belongs to the query hash and the index version it was computed
+    against; matches() tells the caller when it has to be recomputed. Cursors are
+    offsets into the frozen ranking, so paging never rescores the corpus and a
+    page is stable even if the index changes in between.
+    """
+
+    def __init__(self, key, version, ranking, query_embedding=None, section_weights=None):
+        self.key = key
+        self.version = version
+        self.ranking = list(ranking)
+        # Kept so snippets can be computed for just the rows on screen, from
+        # the sections the ranking was scored on.
+        self.query_embedding = query_embedding
+        self.section_weights = section_weights
+        # Hydrated rows by candidate id, filled in as pages are viewed so a
+        # cached ranking also skips the database for pages already seen.
+        self.details = {}
+        self.snippets = {}
+
+    def __len__(self):
+        return len(self.ranking)
+
+    def matches(self, key, version):
+        return self.key == key and self.version == version
+
+    def page(self, cursor=0, page_size=10):
+        """
+        Return (rows, next_cursor) for the page starting at cursor. rows is a
+        list of (candidate_id, score); next_cursor is None on the last page.
+        """
+        cursor = max(0, min(cursor or 0, len(self.ranking)))
+        end = cursor + page_size
+        return self.ranking[cursor:end], end if end < len(self.ranking) else None
+
+    @staticmethod
+    def previous_cursor(cursor, page_size=10):
+        """
+        Cursor of the page before the one starting at cursor, or None on the first page.
+        """
+        return max(0, cursor - page_size) if cursor > 0 else None
+
+
+class SearchResultCache:
+    """
+    Process-wide LRU cache of RankedResults shared by every session, so a popular
+    search is embedded, scored and hydrated once.
+
+    Entries are keyed by query hash and only served while the index version they
+    were ranked against is current, so ingest and deletes invalidate them
+    automatically. The ttl bounds how long hydrated candidate details, which do
+    not change the index version, can go stale.
+    """
+
+    def __init__(self, max_size=256, ttl=600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0].version == version and time.time() - entry[1] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, results):
+        with self._lock:
+            self._entries[results.key] = (results, time.time())
+            self._entries.move_to_end(results.key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
@@ -0,0 +1,69 @@
+import re
+import numpy as np
+from search_engine import combine_scores, top_k
+
+BULLET_PATTERN = re.compile(r"^\s*(?:[-*•·]+|\d+[.)])\s*")
+
+
+def split_requirements(job_description):
+    """
+    Split a job description into requirement lines, dropping bullets,
+    numbering and blank lines.
+    """
+    requirements = []
+    for line in job_description.splitlines():
+        line = BULLET_PATTERN.sub("", line).strip()
+        if line:
+            requirements.append(line)
+    return requirements
+
+
+def embed_queries(query_texts, model, cache=None, model_name=None):
+    """
+    Embed many queries with a single model.encode call. With a
+    QueryEmbeddingCache only the texts not already cached are encoded.
+    """
+    if cache is not None:
+        return cache.get_or_compute_many(query_texts, model_name, model.encode)
+    return np.asarray(model.encode(query_texts), dtype=np.float32)
+
+
+def match_role(engine, model, job_description, top_n=5, combine="mean", cache=None, model_name=None,
+               candidate_filter=None, aggregation="max"):
+    """
+    Rank candidates for one job description by scoring every requirement line
+    in one batched pass and combining the per-requirement scores.
+    """
+    requirements = split_requirements(job_description)
+    if not requirements:
+        return []
+    embeddings = embed_queries(requirements, model, cache, model_name)
+    return engine.search_role(embeddings, top_n=top_n, combine=combine, candidate_filter=candidate_filter,
+                              aggregation=aggregation)
+
+
+def match_roles(engine, model, roles, top_n=20, combine="mean", cache=None, model_name=None, aggregation="max"):
+    """
+    Re-score many open roles at once, e.g. in a nightly job. roles maps a role
+    name to its job description. All requirement lines of all roles are embedded
+    in one encode call and scored against the corpus in one batched pass.
+    Returns {role name: [(candidate_id, score), ...]}.
+    """
+    names, requirements, owners = [], [], []
+    for name, job_description in roles.items():
+        lines = split_requirements(job_description)
+        names.append(name)
+        requirements.extend(lines)
+        owners.extend([len(names) - 1] * len(lines))
+    results = {name: [] for name in names}
+    if not requirements:
+        return results
+
+    embeddings = embed_queries(requirements, model, cache, model_name)
+    candidate_ids, scores = engine.score_candidates_batch(embeddings, aggregation=aggregation)
+    owners = np.array(owners)
+    for index, name in enumerate(names):
+        columns = np.flatnonzero(owners == index)
+        if len(columns):
+            results[name] = top_k(candidate_ids, combine_scores(scores[:, columns], combine=combine), top_n)
+    return results
@@ -0,0 +1,884 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from embedding_format import decode_stored_embedding
+from embedding_store import sort_keys_decrease
+from id_window import REFRESH_WINDOW
+
+# Types of embedded text. Rows from before sections existed are whole-resume chunks.
+SECTIONS = ("resume", "skills", "experience", "education")
+SECTION_CODES = {name: code for code, name in enumerate(SECTIONS)}
+
+
+class SearchEngine:
+    """
+    In-memory semantic search over resume chunk embeddings.
+
+    All chunk embeddings are held in one pre-normalized float32 matrix with
+    parallel arrays of candidate ids and ResumeEmbeddings row ids. Rows are kept
+    sorted by candidate id so the chunks of one candidate are contiguous, which
+    lets per-candidate scores be computed with a single vectorized group reduction.
+
+    The engine tracks a high-water mark on ResumeEmbeddings.id and on
+    EmbeddingTombstones.id, so refresh() only pulls rows added or candidates
+    deleted since the last call. Ids within REFRESH_WINDOW below the marks are
+    read again and rows the engine already holds are skipped, so rows whose
+    transaction committed out of id order are still picked up.
+
+    An approximate index (see ann_index.IVFIndex) can be attached with
+    attach_index; it is kept in step with add/remove and used by search unless
+    exact=True is passed, so exact search stays available as a fallback.
+
+    A quantizer (see quantization.py) can be attached with attach_quantizer;
+    searches then shortlist candidates on the compressed codes and re-score only
+    the shortlist against the full-precision rows.
+
+    With use_centroids, searches first rank candidates by one centroid vector each
+    (the normalized mean of their chunks) and re-score only the shortlisted
+    candidates' chunks exactly, so a query scans about one row per candidate
+    instead of one per chunk.
+
+    Every row is tagged with the section it was embedded from (see SECTIONS),
+    and rows are sorted by section within each candidate, so a search with
+    section_weights scans only the weighted sections and reduces each
+    (candidate, section) block in the same vectorized pass. Searches without
+    section_weights score whole-resume rows only, on every path (exact, shards,
+    index, quantizer, centroids and batches): typed section rows repeat text
+    the resume chunks already hold, and scoring them too would double the rows
+    scanned and count that text twice in mean-style aggregations and centroids.
+    Resume rows sort first within each candidate, so they are the span from
+    the group's start to resume_ends. Mixing in typed rows is opt-in through
+    section_weights.
+
+    With set_shards(n), exact scans split the rows into n shards of whole
+    candidates that are scored on a thread pool (NumPy releases the GIL in the
+    matrix-vector product and the group reductions) and merged by per-shard top-k.
+
+    With an EmbeddingStore the rows live in memory-mapped files instead of
+    process memory, shared by every process that opens the same store.
+    """
+
+    def __init__(self, dim=384, store=None):
+        self.dim = dim
+        self.matrix = np.empty((0, dim), dtype=np.float32)
+        self.candidate_ids = np.empty(0, dtype=np.int64)
+        self.row_ids = np.empty(0, dtype=np.int64)
+        self.sections = np.empty(0, dtype=np.int8)
+        # Start offset of every candidate's block of rows, plus the matching ids.
+        self.group_starts = np.empty(0, dtype=np.int64)
+        self.group_ids = np.empty(0, dtype=np.int64)
+        # End of every candidate's whole-resume rows, and how many rows are typed
+        # section rows; unweighted searches scan only the resume spans.
+        self.resume_ends = np.empty(0, dtype=np.int64)
+        self.typed_rows = 0
+        self.last_id = 0
+        self.last_tombstone_id = None
+        # Rows that failed to decode, so trailing-window refreshes do not retry them.
+        self._skipped_row_ids = set()
+        self._recent = None
+        # Bumped on every change so callers can tell when cached results are stale.
+        self.version = 0
+        self.index = None
+        self.quantizer = None
+        self.codes = None
+        self.rerank = 300
+        self.centroids = None
+        # Per candidate (row count, sum of row ids), to tell whose rows changed.
+        self.centroid_keys = None
+        self.centroid_shortlist = None
+        self.shards = 1
+        self.shard_bounds = None
+        self._pool = None
+        # Parameters of the "topk_mean" and "softmax" aggregations.
+        self.topk = 3
+        self.softmax_temperature = 0.05
+        self.store = store
+        self._store_state = None
+        self._lock = threading.RLock()
+        if store is not None:
+            self._load_store()
+
+    def __len__(self):
+        return len(self.candidate_ids)
+
+    @property
+    def num_candidates(self):
+        return len(self.group_ids)
+
+    def add(self, candidate_ids, embeddings, row_ids=None, sections=None):
+        """
+        Add chunk embeddings for the given candidate ids, optionally tagged with
+        section codes (default: whole-resume chunks).
+        Embeddings are normalized on the way in so scoring is a plain dot product.
+        """
+        self._add(candidate_ids, embeddings, row_ids, sections)
+
+    def _add(self, candidate_ids, embeddings, row_ids=None, sections=None, marks=None):
+        # marks (database high-water marks) are written to a store in the same
+        # meta update as the rows, so a crash cannot separate the two.
+        candidate_ids = np.asarray(candidate_ids, dtype=np.int64)
+        if len(candidate_ids) == 0:
+            return
+        embeddings = normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(candidate_ids), self.dim))
+        if row_ids is None:
+            row_ids = np.full(len(candidate_ids), -1, dtype=np.int64)
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        if sections is None:
+            sections = np.zeros(len(candidate_ids), dtype=np.int8)
+        sections = np.asarray(sections, dtype=np.int8)
+
+        with self._lock:
+            if self.store is not None:
+                self.store.append(candidate_ids, embeddings, row_ids, sections, marks)
+                self._load_store()
+                return
+            order = np.lexsort((sections, candidate_ids))
+            candidate_ids, embeddings, row_ids, sections = (candidate_ids[order], embeddings[order], row_ids[order],
+                                                            sections[order])
+            matrix = np.concatenate([self.matrix, embeddings])
+            ids = np.concatenate([self.candidate_ids, candidate_ids])
+            rows = np.concatenate([self.row_ids, row_ids])
+            codes = np.concatenate([self.sections, sections])
+            # New rows usually belong to newer (larger) candidate ids, so once the
+            # batch is sorted only pay for a full sort when it starts before the end.
+            if np.any(sort_keys_decrease(np.concatenate([self.candidate_ids[-1:], candidate_ids[:1]]),
+                                         np.concatenate([self.sections[-1:], sections[:1]]))):
+                order = np.lexsort((codes, ids))
+                matrix, ids, rows, codes = matrix[order], ids[order], rows[order], codes[order]
+            self._set_rows(matrix, ids, rows, codes)
+
+    def remove_candidates(self, candidate_ids):
+        """
+        Drop every chunk belonging to the given candidates.
+        Returns the number of chunks removed.
+        """
+        return self._remove(candidate_ids)
+
+    def _remove(self, candidate_ids, marks=None):
+        with self._lock:
+            if self.store is not None:
+                removed = self.store.remove_candidates(candidate_ids, marks)
+                self._load_store()
+                return removed
+            keep = ~np.isin(self.candidate_ids, np.asarray(candidate_ids, dtype=np.int64))
+            removed = len(keep) - int(keep.sum())
+            if removed:
+                self._set_rows(self.matrix[keep], self.candidate_ids[keep], self.row_ids[keep],
+                               self.sections[keep])
+            return removed
+
+    def attach_index(self, index):
+        """
+        Use an approximate index for searches. An untrained index is built from the
+        current rows; a trained one (e.g. loaded from disk) is brought in sync by
+        dropping rows the engine no longer has and adding the ones it is missing.
+        """
+        with self._lock:
+            if not index.is_trained:
+                resume = self.sections == 0
+                index.build(self.row_ids[resume], self.candidate_ids[resume], self.matrix[resume])
+            self.index = index
+            self._sync_index()
+            self.version += 1
+
+    def attach_quantizer(self, quantizer, rerank=300):
+        """
+        Encode every row with the quantizer (training it on the current rows if
+        needed) and shortlist the top rerank candidates on the codes in searches.
+        """
+        with self._lock:
+            if not quantizer.is_trained:
+                quantizer.train(self.matrix)
+            self.quantizer = quantizer
+            self.rerank = rerank
+            self.codes = quantizer.encode(self.matrix)
+            self.version += 1
+
+    def use_centroids(self, shortlist=1000):
+        """
+        Shortlist the top shortlist candidates by centroid in searches and re-score
+        only their chunks. On every change only the centroids of candidates whose
+        rows changed are recomputed.
+        """
+        with self._lock:
+            self.centroid_shortlist = shortlist
+            self.centroids = self._centroids(np.arange(self.num_candidates))
+            self.centroid_keys = group_keys(self.row_ids, self.group_starts)
+            self.version += 1
+
+    def set_shards(self, shards):
+        """
+        Score exact scans in this many parallel shards; 1 scans in the calling thread.
+        """
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+            self.shards = max(1, int(shards))
+            self._pool = ThreadPoolExecutor(self.shards, thread_name_prefix="search-shard") if self.shards > 1 else None
+            self.shard_bounds = shard_bounds(self.group_starts, len(self), self.shards)
+
+    def _sync_codes(self, old_row_ids, old_codes):
+        # Reuse codes of rows that survived the change and encode only new rows.
+        found = np.zeros(len(self.row_ids), dtype=bool)
+        codes = np.empty((len(self.row_ids),) + old_codes.shape[1:], dtype=old_codes.dtype)
+        if len(old_row_ids):
+            order = np.argsort(old_row_ids, kind="stable")
+            sorted_ids = old_row_ids[order]
+            pos = np.minimum(np.searchsorted(sorted_ids, self.row_ids), len(sorted_ids) - 1)
+            found = (sorted_ids[pos] == self.row_ids) & (self.row_ids >= 0)
+            codes[found] = old_codes[order[pos[found]]]
+        missing = ~found
+        if np.any(missing):
+            codes[missing] = self.quantizer.encode(self.matrix[missing])
+        self.codes = codes
+
+    def _sync_centroids(self, old_group_ids):
+        # Reuse centroids of candidates whose rows are unchanged (same count and
+        # row ids) and average only the rows of new or changed candidates.
+        keys = group_keys(self.row_ids, self.group_starts)
+        centroids = np.empty((len(self.group_ids), self.dim), dtype=np.float32)
+        found = np.zeros(len(self.group_ids), dtype=bool)
+        if len(old_group_ids):
+            pos = np.minimum(np.searchsorted(old_group_ids, self.group_ids), len(old_group_ids) - 1)
+            found = (old_group_ids[pos] == self.group_ids) & np.all(self.centroid_keys[pos] == keys, axis=1)
+            centroids[found] = self.centroids[pos[found]]
+        changed = np.flatnonzero(~found)
+        if len(changed):
+            centroids[changed] = self._centroids(changed)
+        self.centroids, self.centroid_keys = centroids, keys
+
+    def _centroids(self, groups):
+        # Centroids of the given groups' whole-resume rows; groups without any stay zero.
+        centroids = np.zeros((len(groups), self.dim), dtype=np.float32)
+        has_resume = self.resume_ends[groups] > self.group_starts[groups]
+        if np.any(has_resume):
+            rows, starts = group_rows(self.group_starts[groups[has_resume]], self.resume_ends[groups[has_resume]])
+            centroids[has_resume] = candidate_centroids(self.matrix[rows], starts)
+        return centroids
+
+    def _resume_groups(self, groups):
+        # The given groups that have whole-resume rows to score.
+        if not self.typed_rows:
+            return groups
+        return groups[self.resume_ends[groups] > self.group_starts[groups]]
+
+    def _sync_index(self):
+        # Drop rows the engine no longer has, add new ones and re-point the index
+        # at the current rows. Only whole-resume rows are indexed.
+        if self.index is None:
+            return
+        resume = self.sections == 0
+        indexed = self.index.all_ids()
+        self.index.remove(ids=indexed[~np.isin(indexed, self.row_ids[resume])])
+        missing = np.flatnonzero(resume & ~np.isin(self.row_ids, indexed))
+        if len(missing):
+            self.index.add(self.row_ids[missing], self.candidate_ids[missing], self.matrix[missing])
+        self.index.bind(self.matrix, self.row_ids)
+
+    def _load_store(self):
+        """
+        Point the engine at the store's current memory maps if they changed,
+        including changes written by other processes.
+        """
+        self.store.reload()
+        if self.store.state != self._store_state:
+            self._store_state = self.store.state
+            self._set_rows(self.store.matrix, self.store.candidate_ids, self.store.row_ids, self.store.sections)
+
+    def _set_rows(self, matrix, candidate_ids, row_ids, sections):
+        old_row_ids, old_group_ids = self.row_ids, self.group_ids
+        self.matrix = matrix
+        self.candidate_ids = candidate_ids
+        self.row_ids = row_ids
+        self.sections = sections
+        if len(candidate_ids) == 0:
+            self.group_starts = np.empty(0, dtype=np.int64)
+            self.group_ids = np.empty(0, dtype=np.int64)
+            self.resume_ends = np.empty(0, dtype=np.int64)
+        else:
+            boundaries = np.flatnonzero(candidate_ids[1:] != candidate_ids[:-1]) + 1
+            self.group_starts = np.concatenate([[0], boundaries]).astype(np.int64)
+            self.group_ids = candidate_ids[self.group_starts]
+            resume_counts = np.add.reduceat((np.asarray(sections) == 0).astype(np.int64), self.group_starts)
+            self.resume_ends = self.group_starts + resume_counts
+        self.typed_rows = len(candidate_ids) - int((self.resume_ends - self.group_starts).sum())
+        if self.quantizer is not None:
+            self._sync_codes(old_row_ids, self.codes)
+        if self.centroid_shortlist is not None:
+            self._sync_centroids(old_group_ids)
+        if self.shards > 1:
+            self.shard_bounds = shard_bounds(self.group_starts, len(candidate_ids), self.shards)
+        self._sync_index()
+        self.version += 1
+
+    def refresh(self, connection):
+        """
+        Bring the engine up to date with the database.
+
+        Applies tombstones for deleted candidates first, then loads embedding rows
+        above the high-water mark. Both queries hit the primary key, so this is
+        cheap to call before every search. Returns True if anything changed.
+
+        With a store, the high-water marks are kept in the store's meta. Changes
+        are first looked for without the store's writer lock, so searches in
+        different processes do not queue behind each other; only a process that
+        finds something new takes the lock, checks again and writes the rows
+        together with the new marks. The others just re-map the files.
+        """
+        with self._lock:
+            version = self.version
+            if self.store is None:
+                changes = self._read_changes(connection)
+                if changes is not None:
+                    self._apply_changes(*changes)
+                return self.version != version
+            self._load_store()
+            self.last_id, self.last_tombstone_id = self.store.last_id, self.store.last_tombstone_id
+            if self._read_changes(connection, rows=False) is not None:
+                with self.store.locked():
+                    # Another process may have written the same changes meanwhile.
+                    self._load_store()
+                    self.last_id, self.last_tombstone_id = self.store.last_id, self.store.last_tombstone_id
+                    changes = self._read_changes(connection)
+                    if changes is not None:
+                        self._apply_changes(*changes)
+            return self.version != version
+
+    def _read_changes(self, connection, rows=True):
+        """
+        Read what changed in the database since the marks, without applying it.
+        Returns (deleted candidate ids, (candidate_ids, embeddings, row_ids,
+        sections) of new rows or None, new marks), or None if nothing changed.
+        With rows=False new rows are only detected, not fetched.
+        """
+        with self._lock:
+            cursor = connection.cursor()
+            last_id, last_tombstone_id = self.last_id, self.last_tombstone_id
+
+            if last_tombstone_id is None:
+                # Rows of candidates deleted before the first load are already gone,
+                # so existing tombstones only set the starting point.
+                cursor.execute("SELECT COALESCE(MAX(id), 0) FROM EmbeddingTombstones")
+                last_tombstone_id = cursor.fetchone()[0]
+            # Tombstones stay in the window for a while; candidates the engine no
+            # longer holds were already removed.
+            cursor.execute(
+                "SELECT id, candidate_id FROM EmbeddingTombstones WHERE id > %s ORDER BY id",
+                (max(last_tombstone_id - REFRESH_WINDOW, 0),)
+            )
+            tombstones = cursor.fetchall()
+            deleted = self._held([candidate_id for _, candidate_id in tombstones])
+            if tombstones:
+                last_tombstone_id = max(last_tombstone_id, tombstones[-1][0])
+
+            # Re-read a trailing window of ids so rows whose transaction committed
+            # after higher ids were pulled are not lost; rows already held are skipped.
+            floor = max(last_id - REFRESH_WINDOW, 0)
+            cursor.execute("SELECT id FROM ResumeEmbeddings WHERE id > %s ORDER BY id", (floor,))
+            ids = np.array([row[0] for row in cursor.fetchall()], dtype=np.int64)
+            new_ids = ids[~np.isin(ids, self._recent_row_ids(floor))]
+            if len(ids):
+                last_id = max(last_id, int(ids[-1]))
+            marks = (last_id, last_tombstone_id)
+            if len(new_ids) == 0 or not rows:
+                cursor.close()
+                changed = len(deleted) or len(new_ids) or marks != (self.last_id, self.last_tombstone_id)
+                return (deleted, None, marks) if changed else None
+            cursor.execute(
+                """SELECT id, candidate_id, embedding_blob, embedding, section FROM ResumeEmbeddings
+                   WHERE id BETWEEN %s AND %s ORDER BY id""",
+                (int(new_ids[0]), int(new_ids[-1]))
+            )
+            wanted = set(new_ids.tolist())
+            fetched = [row for row in cursor.fetchall() if row[0] in wanted]
+            cursor.close()
+
+            row_ids, candidate_ids, embeddings, sections = [], [], [], []
+            for row_id, candidate_id, embedding_blob, embedding_str, section in fetched:
+                try:
+                    embedding = decode_stored_embedding(embedding_blob, embedding_str)
+                except Exception as e:
+                    print(f"Error parsing embedding {row_id} for candidate {candidate_id}: {e}")
+                    self._skipped_row_ids.add(row_id)
+                    continue
+                row_ids.append(row_id)
+                candidate_ids.append(candidate_id)
+                embeddings.append(embedding)
+                sections.append(SECTION_CODES.get(section or "resume", 0))
+            new_rows = (candidate_ids, np.stack(embeddings), row_ids, sections) if embeddings else None
+            return deleted, new_rows, marks
+
+    def _apply_changes(self, deleted, new_rows, marks):
+        # The last write carries the new marks, so after a crash the changes are
+        # simply read again and the rows already held are skipped.
+        with self._lock:
+            if len(deleted):
+                self._remove(deleted, None if new_rows else marks)
+            if new_rows:
+                self._add(*new_rows, marks=marks)
+            elif not len(deleted) and self.store is not None:
+                self.store.set_marks(*marks)
+            self.last_id, self.last_tombstone_id = marks
+
+    def _held(self, candidate_ids):
+        # The given candidate ids that have rows in the engine.
+        candidate_ids = np.asarray(candidate_ids, dtype=np.int64)
+        if len(self.group_ids) == 0:
+            return candidate_ids[:0]
+        pos = np.minimum(np.searchsorted(self.group_ids, candidate_ids), len(self.group_ids) - 1)
+        return np.unique(candidate_ids[self.group_ids[pos] == candidate_ids])
+
+    def _recent_row_ids(self, floor):
+        # Row ids above floor that the engine holds or could not decode, cached
+        # per version since this scans every row.
+        key = (self.version, floor)
+        if self._recent is None or self._recent[0] != key:
+            held = self.row_ids[self.row_ids > floor]
+            skipped = np.array([row_id for row_id in self._skipped_row_ids if row_id > floor], dtype=np.int64)
+            self._skipped_row_ids = set(skipped.tolist())
+            self._recent = (key, np.concatenate([held, skipped]))
+        return self._recent[1]
+
+    def score_chunks(self, query_embedding):
+        """
+        Cosine similarity of the query against every chunk, as one matrix-vector product.
+        """
+        query = normalize(np.asarray(query_embedding, dtype=np.float32).reshape(1, self.dim))[0]
+        return self.matrix @ query
+
+    def aggregate(self, chunk_scores, starts, aggregation="max"):
+        return aggregate_groups(chunk_scores, starts, aggregation, k=self.topk, temperature=self.softmax_temperature)
+
+    def score_candidates(self, query_embedding, candidate_filter=None, aggregation="max"):
+        """
+        Return (candidate_ids, scores) with one score per candidate, aggregated
+        over its whole-resume chunk similarities (see aggregate_groups). With a
+        candidate_filter (array of allowed candidate ids) only the rows of those
+        candidates are gathered and scored.
+        """
+        with self._lock:
+            if candidate_filter is not None:
+                groups = np.flatnonzero(np.isin(self.group_ids, candidate_filter))
+                return self._score_groups(query_embedding, groups, aggregation)
+            if self.typed_rows:
+                return self._score_groups(query_embedding, np.arange(self.num_candidates), aggregation)
+            if len(self) == 0:
+                return self.group_ids, np.empty(0, dtype=np.float32)
+            chunk_scores = self.score_chunks(query_embedding)
+            return self.group_ids, self.aggregate(chunk_scores, self.group_starts, aggregation)
+
+    def section_candidates(self, query_embedding, section_weights, candidate_filter=None):
+        """
+        Score candidates on the weighted sections only. Each candidate's score is
+        the weighted mean, over the weighted sections it has, of its best chunk in
+        each section, so a missing section neither helps nor hurts. Rows of
+        zero-weight sections are never scanned.
+        """
+        weights = np.array([section_weights.get(name, 0.0) for name in SECTIONS], dtype=np.float32)
+        query = normalize(np.asarray(query_embedding, dtype=np.float32).reshape(1, self.dim))[0]
+        with self._lock:
+            if candidate_filter is not None:
+                groups = np.flatnonzero(np.isin(self.group_ids, candidate_filter))
+                rows, _ = group_rows(self.group_starts[groups], self.group_ends()[groups])
+            else:
+                rows = np.arange(len(self), dtype=np.int64)
+            if not np.all(weights > 0):
+                rows = rows[weights[self.sections[rows]] > 0]
+            if len(rows) == 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            chunk_scores = gather_scores(self.matrix, rows, query)
+            ids, codes = self.candidate_ids[rows], self.sections[rows]
+            # Rows are sorted by (candidate, section), so each pair is one contiguous block.
+            changes = (ids[1:] != ids[:-1]) | (codes[1:] != codes[:-1])
+            block_starts = np.flatnonzero(np.concatenate([[True], changes]))
+            best = np.maximum.reduceat(chunk_scores, block_starts)
+            block_ids, block_weights = ids[block_starts], weights[codes[block_starts]]
+            starts = np.flatnonzero(np.concatenate([[True], block_ids[1:] != block_ids[:-1]]))
+            scores = np.add.reduceat(best * block_weights, starts) / np.add.reduceat(block_weights, starts)
+            return block_ids[starts], scores.astype(np.float32)
+
+    def sharded_candidates(self, query_embedding, top_n, aggregation="max"):
+        """
+        Exact scores of every shard's top_n candidates, scored in parallel.
+        The global top_n is always among them.
+        """
+        query = normalize(np.asarray(query_embedding, dtype=np.float32).reshape(1, self.dim))[0]
+        with self._lock:
+            if len(self) == 0:
+                return self.group_ids, np.empty(0, dtype=np.float32)
+            # Workers only see these arrays, never self, so a concurrent refresh
+            # cannot swap rows out from under a running scan.
+            matrix, group_starts, group_ids, total = self.matrix, self.group_starts, self.group_ids, len(self)
+            resume_ends, typed_rows = self.resume_ends, self.typed_rows
+            bounds = self.shard_bounds
+
+            def score_shard(first, last):
+                if typed_rows:
+                    groups = np.arange(first, last)
+                    groups = groups[resume_ends[groups] > group_starts[groups]]
+                    rows, offsets = group_rows(group_starts[groups], resume_ends[groups])
+                    chunk_scores = gather_scores(matrix, rows, query)
+                    ids = group_ids[groups]
+                else:
+                    start = group_starts[first]
+                    end = group_starts[last] if last < len(group_starts) else total
+                    chunk_scores = np.asarray(matrix[start:end]) @ query
+                    offsets, ids = group_starts[first:last] - start, group_ids[first:last]
+                scores = self.aggregate(chunk_scores, offsets, aggregation)
+                if top_n < len(scores):
+                    best = np.argpartition(-scores, top_n - 1)[:top_n]
+                    return ids[best], scores[best]
+                return ids, scores
+
+            parts = list(self._pool.map(score_shard, bounds[:-1], bounds[1:]))
+        return np.concatenate([ids for ids, _ in parts]), np.concatenate([scores for _, scores in parts])
+
+    def _score_groups(self, query_embedding, groups, aggregation="max"):
+        # Exact scores over the whole-resume rows of a subset of candidates, given
+        # by their group positions. Candidates without resume rows are left out.
+        groups = self._resume_groups(groups)
+        if len(groups) == 0:
+            return self.group_ids[groups], np.empty(0, dtype=np.float32)
+        query = normalize(np.asarray(query_embedding, dtype=np.float32).reshape(1, self.dim))[0]
+        rows, starts = group_rows(self.group_starts[groups], self.resume_ends[groups])
+        chunk_scores = gather_scores(self.matrix, rows, query)
+        return self.group_ids[groups], self.aggregate(chunk_scores, starts, aggregation)
+
+    def approximate_candidates(self, query_embedding, top_n, oversample=10, aggregation="max"):
+        """
+        Candidate scores from the attached index. The index returns chunks, so it is
+        asked for oversample x top_n of them and each candidate keeps its best chunk.
+        Other aggregations re-score the retrieved candidates exactly.
+        """
+        query = normalize(np.asarray(query_embedding, dtype=np.float32).reshape(1, self.dim))[0]
+        with self._lock:
+            _, labels, scores = self.index.search(query, k=top_n * oversample)
+            # Scores arrive best first, so the first occurrence of a label is its max.
+            candidate_ids, first = np.unique(labels, return_index=True)
+            if aggregation == "max":
+                return candidate_ids, scores[first]
+            return self._score_groups(query, np.searchsorted(self.group_ids, candidate_ids), aggregation)
+
+    def quantized_candidates(self, query_embedding, top_n, aggregation="max"):
+        """
+        Score every candidate on the quantized codes, then re-score the best
+        rerank of them exactly against their full-precision chunks.
+        """
+        query = normalize(np.asarray(query_embedding, dtype=np.float32).reshape(1, self.dim))[0]
+        with self._lock:
+            if len(self) == 0:
+                return self.group_ids, np.empty(0, dtype=np.float32)
+            chunk_scores = self.quantizer.score(self.codes, query)
+            if self.typed_rows:
+                chunk_scores = np.where(self.sections == 0, chunk_scores, -np.inf)
+            approx = np.maximum.reduceat(chunk_scores, self.group_starts)
+            shortlist = max(self.rerank, top_n)
+            if shortlist < len(approx):
+                groups = np.sort(np.argpartition(-approx, shortlist - 1)[:shortlist])
+            else:
+                groups = np.arange(len(approx))
+            return self._score_groups(query, groups, aggregation)
+
+    def centroid_candidates(self, query_embedding, top_n, aggregation="max"):
+        """
+        Score every candidate by its centroid, then re-score the best
+        centroid_shortlist of them exactly against their chunks.
+        """
+        query = normalize(np.asarray(query_embedding, dtype=np.float32).reshape(1, self.dim))[0]
+        with self._lock:
+            if len(self) == 0:
+                return self.group_ids, np.empty(0, dtype=np.float32)
+            approx = self.centroids @ query
+            shortlist = max(self.centroid_shortlist, top_n)
+            if shortlist < len(approx):
+                groups = np.sort(np.argpartition(-approx, shortlist - 1)[:shortlist])
+            else:
+                groups = np.arange(len(approx))
+            return self._score_groups(query, groups, aggregation)
+
+    def candidate_vector(self, candidate_id):
+        """
+        A candidate's centroid, built from its whole-resume rows, or None if the
+        engine has none for it.
+        """
+        with self._lock:
+            group = np.searchsorted(self.group_ids, candidate_id)
+            if group == len(self.group_ids) or self.group_ids[group] != candidate_id:
+                return None
+            if self.resume_ends[group] == self.group_starts[group]:
+                return None
+            if self.centroids is not None:
+                return self.centroids[group]
+            start, end = self.group_starts[group], self.resume_ends[group]
+            return candidate_centroids(self.matrix[start:end], np.zeros(1, dtype=np.int64))[0]
+
+    def similar_candidates(self, candidate_id, top_n=5, min_score=None, aggregation="max"):
+        """
+        "More like this": rank other candidates against the given candidate's
+        centroid, through the same search path as a text query but without any
+        model inference. Returns [] if the candidate has no embeddings.
+        """
+        query = self.candidate_vector(candidate_id)
+        if query is None:
+            return []
+        results = self.search(query, top_n=top_n + 1, min_score=min_score, aggregation=aggregation)
+        return [(other_id, score) for other_id, score in results if other_id != candidate_id][:top_n]
+
+    def best_chunks(self, query_embedding, candidate_ids, section_weights=None):
+        """
+        The best-matching chunk of each given candidate, as
+        {candidate_id: ResumeEmbeddings.id}. Only those candidates' rows are scored.
+        With section_weights, only rows of sections weighted above zero count,
+        as in section_candidates; without, only whole-resume rows, as in
+        unweighted searches. Candidates with no such rows are left out.
+        """
+        with self._lock:
+            groups = np.flatnonzero(np.isin(self.group_ids, np.asarray(candidate_ids, dtype=np.int64)))
+            if section_weights:
+                rows, _ = group_rows(self.group_starts[groups], self.group_ends()[groups])
+                weights = np.array([section_weights.get(name, 0.0) for name in SECTIONS], dtype=np.float32)
+                rows = rows[weights[self.sections[rows]] > 0]
+            else:
+                rows, _ = group_rows(self.group_starts[groups], self.resume_ends[groups])
+            if len(rows) == 0:
+                return {}
+            query = normalize(np.asarray(query_embedding, dtype=np.float32).reshape(1, self.dim))[0]
+            chunk_scores = gather_scores(self.matrix, rows, query)
+            ids = self.candidate_ids[rows]
+            starts = np.flatnonzero(np.concatenate([[True], ids[1:] != ids[:-1]]))
+            lengths = np.diff(np.append(starts, len(rows)))
+            peaks = np.repeat(np.maximum.reduceat(chunk_scores, starts), lengths)
+            # First row of each group that reaches the group's max.
+            hits = np.flatnonzero(chunk_scores == peaks)
+            _, first = np.unique(np.searchsorted(starts, hits, side="right") - 1, return_index=True)
+            best_rows = rows[hits[first]]
+            return {int(candidate_id): int(row_id)
+                    for candidate_id, row_id in zip(ids[starts], self.row_ids[best_rows])}
+
+    def group_ends(self):
+        return np.append(self.group_starts[1:], len(self)).astype(np.int64)
+
+    def score_candidates_batch(self, query_embeddings, candidate_filter=None, aggregation="max", block_rows=65536):
+        """
+        Score many queries at once with matrix-matrix products.
+        Returns (candidate_ids, scores) with scores shaped (candidates, queries).
+        Rows are processed in blocks of whole candidates of about block_rows chunks
+        so the intermediate chunk-score matrix stays bounded.
+        """
+        queries = normalize(np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self.dim))
+        with self._lock:
+            if candidate_filter is not None:
+                groups = np.flatnonzero(np.isin(self.group_ids, candidate_filter))
+            else:
+                groups = np.arange(self.num_candidates)
+            groups = self._resume_groups(groups)
+            scores = np.empty((len(groups), len(queries)), dtype=np.float32)
+            if len(groups) == 0:
+                return self.group_ids[groups], scores
+            starts = self.group_starts[groups]
+            ends = self.resume_ends[groups]
+            cumulative = np.cumsum(ends - starts)
+            cuts = np.searchsorted(cumulative, np.arange(block_rows, cumulative[-1], block_rows), side="right")
+            bounds = np.unique(np.concatenate([[0], cuts, [len(groups)]]))
+            for first, last in zip(bounds[:-1], bounds[1:]):
+                rows, offsets = group_rows(starts[first:last], ends[first:last])
+                chunk_scores = np.asarray(self.matrix[rows]) @ queries.T
+                scores[first:last] = self.aggregate(chunk_scores, offsets, aggregation)
+            return self.group_ids[groups], scores
+
+    def search_batch(self, query_embeddings, top_n=5, min_score=None, candidate_filter=None, aggregation="max"):
+        """
+        Exact top_n candidates for each query, scored in one batched pass.
+        Returns one list of (candidate_id, score) per query.
+        """
+        candidate_ids, scores = self.score_candidates_batch(query_embeddings, candidate_filter, aggregation)
+        results = []
+        for column in scores.T:
+            ids = candidate_ids
+            if min_score is not None:
+                keep = column >= min_score
+                ids, column = ids[keep], column[keep]
+            results.append(top_k(ids, column, top_n))
+        return results
+
+    def search_role(self, requirement_embeddings, top_n=5, weights=None, combine="mean",
+                    min_score=None, candidate_filter=None, aggregation="max"):
+        """
+        Rank candidates against every requirement of a role at once and combine
+        the per-requirement scores into one ranking:
+            mean - weighted average over requirements
+            min  - the weakest requirement, so candidates must match all of them
+            max  - the strongest requirement
+        """
+        candidate_ids, scores = self.score_candidates_batch(requirement_embeddings, candidate_filter, aggregation)
+        combined = combine_scores(scores, weights, combine)
+        if min_score is not None:
+            keep = combined >= min_score
+            candidate_ids, combined = candidate_ids[keep], combined[keep]
+        return top_k(candidate_ids, combined, top_n)
+
+    def search(self, query_embedding, top_n=5, min_score=None, exact=False, candidate_filter=None,
+               aggregation="max", section_weights=None):
+        """
+        Return a list of (candidate_id, score) for the top_n candidates, best first.
+        Candidates scoring below min_score are dropped. Uses the attached
+        approximate index, quantizer or centroid shortlist unless exact is True.
+
+        candidate_filter restricts the search to the given candidate ids. Filtered
+        searches always scan just the allowed rows exactly, which is both faster
+        and more accurate than post-filtering an approximate result.
+
+        aggregation picks how whole-resume chunk similarities become a candidate
+        score; see aggregate_groups. section_weights ({section name: weight})
+        instead scores only the weighted sections, typed section rows included;
+        see section_candidates.
+        """
+        if section_weights:
+            candidate_ids, scores = self.section_candidates(query_embedding, section_weights, candidate_filter)
+        elif candidate_filter is not None:
+            candidate_ids, scores = self.score_candidates(query_embedding, candidate_filter, aggregation)
+        elif self.index is not None and not exact:
+            candidate_ids, scores = self.approximate_candidates(query_embedding, top_n, aggregation=aggregation)
+        elif self.quantizer is not None and not exact:
+            candidate_ids, scores = self.quantized_candidates(query_embedding, top_n, aggregation)
+        elif self.centroid_shortlist is not None and not exact:
+            candidate_ids, scores = self.centroid_candidates(query_embedding, top_n, aggregation)
+        elif self.shards > 1:
+            candidate_ids, scores = self.sharded_candidates(query_embedding, top_n, aggregation)
+        else:
+            candidate_ids, scores = self.score_candidates(query_embedding, aggregation=aggregation)
+        if min_score is not None:
+            keep = scores >= min_score
+            candidate_ids, scores = candidate_ids[keep], scores[keep]
+        return top_k(candidate_ids, scores, top_n)
+
+
+def normalize(vectors):
+    """
+    Scale each row to unit length. Zero rows are left as zeros so they score 0.
+    """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+AGGREGATIONS = ("max", "mean", "topk_mean", "softmax")
+
+
+def aggregate_groups(chunk_scores, starts, aggregation="max", k=3, temperature=0.05):
+    """
+    Reduce chunk scores to one score per candidate block, without a Python loop.
+    chunk_scores is 1-D, or 2-D with one column per query; starts holds the
+    offset of each block. Aggregations:
+        max       - best chunk
+        mean      - average over all chunks
+        topk_mean - average of the k best chunks, so long resumes are not
+                    rewarded just for having many chunks
+        softmax   - average weighted by exp(score / temperature), a smooth
+                    blend between mean (high temperature) and max (low)
+    """
+    if len(starts) == 0:
+        return np.empty((0,) + chunk_scores.shape[1:], dtype=np.float32)
+    lengths = np.diff(np.append(starts, len(chunk_scores)))
+    column = (-1,) + (1,) * (chunk_scores.ndim - 1)
+    per_group = lengths.reshape(column)
+    if aggregation == "max":
+        return np.maximum.reduceat(chunk_scores, starts, axis=0)
+    if aggregation == "mean":
+        return (np.add.reduceat(chunk_scores, starts, axis=0) / per_group).astype(np.float32)
+    if aggregation == "softmax":
+        # Subtract each block's max first so exp() cannot overflow.
+        peak = np.repeat(np.maximum.reduceat(chunk_scores, starts, axis=0), lengths, axis=0)
+        weights = np.exp((chunk_scores - peak) / temperature)
+        return np.add.reduceat(weights * chunk_scores, starts, axis=0) / np.add.reduceat(weights, starts, axis=0)
+    if aggregation == "topk_mean":
+        # Sort within blocks in one argsort: cosine scores span less than 4, so
+        # block * 4 - score orders by block first and by descending score second.
+        block = np.repeat(np.arange(len(starts)), lengths).reshape(column)
+        order = np.argsort(block * 4.0 - chunk_scores.astype(np.float64), axis=0, kind="stable")
+        ranked = np.take_along_axis(chunk_scores, order, axis=0)
+        rank = (np.arange(len(chunk_scores)) - np.repeat(starts, lengths)).reshape(block.shape)
+        totals = np.add.reduceat(np.where(rank < k, ranked, 0), starts, axis=0)
+        return (totals / np.minimum(per_group, k)).astype(np.float32)
+    raise ValueError(f"Unknown aggregation: {aggregation}")
+
+
+def candidate_centroids(matrix, group_starts):
+    """
+    One unit-length centroid per candidate: the normalized mean of its rows.
+    """
+    if len(group_starts) == 0:
+        return np.empty((0, matrix.shape[1]), dtype=np.float32)
+    return normalize(np.add.reduceat(matrix, group_starts, axis=0)).astype(np.float32)
+
+
+def group_keys(row_ids, group_starts):
+    """
+    (row count, sum of row ids) per candidate group. Row ids are never reused,
+    so the pair changes whenever a candidate gains or loses rows.
+    """
+    if len(group_starts) == 0:
+        return np.empty((0, 2), dtype=np.int64)
+    counts = np.diff(np.append(group_starts, len(row_ids)))
+    return np.stack([counts, np.add.reduceat(np.asarray(row_ids, dtype=np.int64), group_starts)], axis=1)
+
+
+def shard_bounds(group_starts, num_rows, shards):
+    """
+    Split the candidate groups into at most shards contiguous ranges of roughly
+    equal row counts. Returns the group index where each shard starts, plus the
+    number of groups as the final bound.
+    """
+    targets = np.arange(1, shards) * num_rows / shards
+    cuts = np.searchsorted(group_starts, targets)
+    return np.unique(np.concatenate([[0], cuts, [len(group_starts)]])).astype(np.int64)
+
+
+def gather_scores(matrix, rows, query, block_rows=4096):
+    """
+    matrix[rows] @ query, gathered a block of rows at a time so the copy stays
+    in cache instead of first materializing every selected row.
+    """
+    scores = np.empty(len(rows), dtype=np.float32)
+    for start in range(0, len(rows), block_rows):
+        scores[start:start + block_rows] = np.take(matrix, rows[start:start + block_rows], axis=0) @ query
+    return scores
+
+
+def group_rows(starts, ends):
+    """
+    Row indices covering the [start, end) ranges back to back, plus the offset
+    where each range begins in the result (for reduceat over the gathered rows).
+    """
+    lengths = ends - starts
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+    rows = np.arange(lengths.sum(), dtype=np.int64) - np.repeat(offsets - starts, lengths)
+    return rows, offsets
+
+
+def combine_scores(scores, weights=None, combine="mean"):
+    """
+    Collapse a (candidates, requirements) score matrix into one score per candidate.
+    """
+    if combine == "mean":
+        weights = np.ones(scores.shape[1], dtype=np.float32) if weights is None else np.asarray(weights, dtype=np.float32)
+        return scores @ weights / weights.sum()
+    if combine == "min":
+        return scores.min(axis=1)
+    if combine == "max":
+        return scores.max(axis=1)
+    raise ValueError(f"Unknown combine mode: {combine}")
+
+
+def top_k(ids, scores, k):
+    """
+    Pick the k best (id, score) pairs using a partial sort, best first.
+    """
+    if k <= 0 or len(scores) == 0:
+        return []
+    if k < len(scores):
+        part = np.argpartition(-scores, k - 1)[:k]
+    else:
+        part = np.arange(len(scores))
+    order = part[np.argsort(-scores[part], kind="stable")]
+    return [(int(ids[i]), float(scores[i])) for i in order]
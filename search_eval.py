@@ -0,0 +1,271 @@
+"""
+Offline evaluation of the search paths on a synthetic, labelled corpus.
+
+Resumes are generated from a vocabulary of skill topics, and each query asks
+for a few terms of one topic. Its relevant set is the k holders of that topic
+whose best chunk matches the query terms best: the most distinct query terms,
+then the densest. That set is no larger than k, so precision@k only reaches 1
+when a path returns the labelled best matches. Text
+is embedded with HashingEmbedder, a deterministic stand-in for the sentence
+model, so the whole run needs no network and no model download.
+
+Usage:
+    python search_eval.py [--candidates 5000] [--queries 200] [--k 10]
+                          [--paths exact,centroids,ivf,int8,pq,sharded]
+                          [--query-set queries.jsonl] [--save-query-set queries.jsonl]
+                          [--json report.json]
+
+For every path it reports p50/p95/p99 latency, QPS, the memory held by the
+engine, recall@k against exact search and precision@k against the labels.
+A query set is JSON lines of {"query": text, "relevant": [candidate ids]}.
+"""
+import argparse
+import hashlib
+import json
+import resource
+import time
+import numpy as np
+from search_engine import SearchEngine
+from ann_index import IVFIndex
+from quantization import ScalarQuantizer, ProductQuantizer
+from lexical_index import tokenize
+
+TOPICS = {
+    "python backend": ["python", "django", "flask", "fastapi", "postgresql", "rest", "celery", "redis"],
+    "data analyst": ["sql", "excel", "tableau", "powerbi", "reporting", "dashboards", "statistics", "pandas"],
+    "machine learning": ["pytorch", "tensorflow", "scikit-learn", "models", "training", "nlp", "mlops", "features"],
+    "frontend": ["react", "typescript", "javascript", "css", "html", "redux", "webpack", "accessibility"],
+    "devops": ["kubernetes", "docker", "terraform", "aws", "ci", "monitoring", "linux", "ansible"],
+    "mobile": ["android", "kotlin", "swift", "ios", "flutter", "mobile", "firebase", "xcode"],
+    "java enterprise": ["java", "spring", "hibernate", "microservices", "maven", "kafka", "jvm", "oracle"],
+    "security": ["penetration", "siem", "firewall", "iam", "compliance", "incident", "vulnerability", "soc"],
+    "project management": ["agile", "scrum", "stakeholders", "roadmap", "jira", "delivery", "budget", "planning"],
+    "embedded": ["c", "firmware", "rtos", "microcontrollers", "uart", "spi", "embedded", "hardware"],
+    "finance": ["accounting", "ifrs", "audit", "forecasting", "treasury", "sap", "reconciliation", "ledger"],
+    "design": ["figma", "ux", "prototyping", "research", "wireframes", "usability", "sketch", "branding"],
+}
+FILLER = ["team", "worked", "responsible", "delivered", "led", "built", "improved", "years", "company",
+          "projects", "clients", "across", "developed", "managed", "experience", "strong", "skills"]
+
+
+class HashingEmbedder:
+    """
+    Stand-in for SentenceTransformer: a signed feature-hashing bag of words.
+    Texts sharing terms get similar vectors, which is enough to exercise every
+    search path. Exposes the same encode() the app calls on the real model.
+    """
+
+    def __init__(self, dim=384):
+        self.dim = dim
+        self._buckets = {}
+
+    def _bucket(self, token):
+        bucket = self._buckets.get(token)
+        if bucket is None:
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            bucket = self._buckets[token] = (value % self.dim, 1.0 if value >> 63 else -1.0)
+        return bucket
+
+    def encode(self, texts, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else texts
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                index, sign = self._bucket(token)
+                vectors[row, index] += sign
+        return vectors[0] if single else vectors
+
+
+def synthetic_corpus(num_candidates, chunks_per_candidate=3, seed=0):
+    """
+    Generate resume chunks. Every candidate holds one to three topics; each
+    chunk mixes terms of one of them with filler words.
+    Returns (candidate_ids, chunk_texts, {topic: set of candidate ids}).
+    """
+    rng = np.random.default_rng(seed)
+    names = list(TOPICS)
+    candidate_ids, texts = [], []
+    holders = {name: set() for name in names}
+    for candidate_id in range(1, num_candidates + 1):
+        topics = rng.choice(names, size=rng.integers(1, 4), replace=False)
+        for topic in topics:
+            holders[topic].add(candidate_id)
+        for _ in range(rng.integers(1, 2 * chunks_per_candidate)):
+            terms = TOPICS[rng.choice(topics)]
+            words = list(rng.choice(terms, size=rng.integers(3, 7))) + list(rng.choice(FILLER, size=rng.integers(5, 15)))
+            rng.shuffle(words)
+            candidate_ids.append(candidate_id)
+            texts.append(" ".join(words))
+    return np.array(candidate_ids, dtype=np.int64), texts, holders
+
+
+def synthetic_queries(candidate_ids, texts, holders, num_queries, k=10, seed=1):
+    """
+    Labelled queries: a few terms of one topic, relevant to the k holders of
+    it whose chunks match the terms best (see the module docstring).
+    """
+    rng = np.random.default_rng(seed)
+    names = list(TOPICS)
+    chunk_tokens = [tokenize(text) for text in texts]
+    chunks_by_term = {}
+    for chunk, tokens in enumerate(chunk_tokens):
+        for term in set(tokens):
+            chunks_by_term.setdefault(term, []).append(chunk)
+    queries = []
+    for _ in range(num_queries):
+        topic = rng.choice(names)
+        terms = rng.choice(TOPICS[topic], size=rng.integers(2, 5), replace=False)
+        best = {}
+        for chunk in set().union(*(chunks_by_term.get(term, ()) for term in terms)):
+            candidate_id = int(candidate_ids[chunk])
+            if candidate_id not in holders[topic]:
+                continue
+            tokens = chunk_tokens[chunk]
+            match = (len(set(terms) & set(tokens)), sum(token in terms for token in tokens) / len(tokens))
+            best[candidate_id] = max(best.get(candidate_id, match), match)
+        relevant = sorted(best, key=lambda candidate_id: best[candidate_id], reverse=True)[:k]
+        queries.append({"query": " ".join(terms), "relevant": sorted(relevant)})
+    return queries
+
+
+def load_query_set(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_query_set(queries, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for query in queries:
+            f.write(json.dumps(query) + "\n")
+
+
+def build_engine(candidate_ids, embeddings, path):
+    """
+    A fresh engine over the corpus, configured for one search path.
+    """
+    engine = SearchEngine(dim=embeddings.shape[1])
+    engine.add(candidate_ids, embeddings, np.arange(1, len(candidate_ids) + 1))
+    if path == "centroids":
+        engine.use_centroids()
+    elif path == "ivf":
+        engine.attach_index(IVFIndex(dim=engine.dim))
+    elif path == "int8":
+        engine.attach_quantizer(ScalarQuantizer(dim=engine.dim))
+    elif path == "pq":
+        engine.attach_quantizer(ProductQuantizer(dim=engine.dim))
+    elif path == "sharded":
+        engine.set_shards(4)
+    elif path != "exact":
+        raise ValueError(f"Unknown search path: {path}")
+    return engine
+
+
+def engine_bytes(engine):
+    """
+    Bytes held by the engine's search structures.
+    """
+    total = engine.matrix.nbytes + engine.candidate_ids.nbytes + engine.row_ids.nbytes
+    for array in (engine.codes, engine.centroids):
+        if array is not None:
+            total += array.nbytes
+    if engine.index is not None:
+        total += engine.index.centroids.nbytes
+        total += sum(r.nbytes + i.nbytes + l.nbytes for r, i, l in
+                     zip(engine.index.list_rows, engine.index.list_ids, engine.index.list_labels))
+    return int(total)
+
+
+def exact_top_k(engine, query_embedding, k):
+    """
+    The exact top-k candidate ids, widened to every candidate tied with the k-th
+    score, so a path is not penalised for breaking ties differently.
+    """
+    results = engine.search(query_embedding, top_n=k, exact=True)
+    if not results:
+        return set()
+    candidate_ids, scores = engine.score_candidates(query_embedding)
+    return set(candidate_ids[scores >= results[-1][1] - 1e-6].tolist())
+
+
+def evaluate_path(engine, query_embeddings, queries, exact_results, k):
+    latencies, recalls, precisions = [], [], []
+    for embedding, query, exact in zip(query_embeddings, queries, exact_results):
+        start = time.perf_counter()
+        results = engine.search(embedding, top_n=k)
+        latencies.append(time.perf_counter() - start)
+        found = {candidate_id for candidate_id, _ in results}
+        if exact:
+            recalls.append(min(len(found & exact), k) / min(len(exact), k))
+        if results:
+            relevant = set(query["relevant"])
+            precisions.append(len(found & relevant) / len(results))
+    latencies = np.array(latencies) * 1000
+    return {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "qps": float(len(latencies) / (latencies.sum() / 1000)),
+        "memory_mb": engine_bytes(engine) / 2 ** 20,
+        f"recall@{k}": float(np.mean(recalls)) if recalls else 1.0,
+        f"precision@{k}": float(np.mean(precisions)) if precisions else 0.0,
+    }
+
+
+def run(num_candidates=5000, num_queries=200, k=10, paths=("exact", "centroids", "ivf", "int8", "pq"),
+        query_set=None, dim=384, seed=0):
+    """
+    Evaluate each path and return {path: metrics}.
+    """
+    embedder = HashingEmbedder(dim)
+    candidate_ids, texts, holders = synthetic_corpus(num_candidates, seed=seed)
+    embeddings = embedder.encode(texts)
+    if query_set is not None:
+        queries = query_set
+    else:
+        queries = synthetic_queries(candidate_ids, texts, holders, num_queries, k, seed=seed + 1)
+    query_embeddings = embedder.encode([query["query"] for query in queries])
+
+    reference = build_engine(candidate_ids, embeddings, "exact")
+    exact_results = [exact_top_k(reference, embedding, k) for embedding in query_embeddings]
+    report = {}
+    for path in paths:
+        engine = reference if path == "exact" else build_engine(candidate_ids, embeddings, path)
+        report[path] = evaluate_path(engine, query_embeddings, queries, exact_results, k)
+    return report, queries, len(candidate_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate search latency, recall and throughput offline.")
+    parser.add_argument("--candidates", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--paths", default="exact,centroids,ivf,int8,pq,sharded")
+    parser.add_argument("--query-set", help="JSON lines query set to evaluate instead of generated queries")
+    parser.add_argument("--save-query-set", help="Write the evaluated query set here")
+    parser.add_argument("--json", help="Also write the report to this file")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    query_set = load_query_set(args.query_set) if args.query_set else None
+    report, queries, num_chunks = run(args.candidates, args.queries, args.k, args.paths.split(","),
+                                      query_set, seed=args.seed)
+    if args.save_query_set:
+        save_query_set(queries, args.save_query_set)
+
+    print(f"{num_chunks:,} chunks, {args.candidates:,} candidates, {len(queries)} queries, k={args.k}\n")
+    columns = ["p50_ms", "p95_ms", "p99_ms", "qps", "memory_mb", f"recall@{args.k}", f"precision@{args.k}"]
+    print(f"{'path':<10}" + "".join(f"{column:>14}" for column in columns))
+    for path, metrics in report.items():
+        print(f"{path:<10}" + "".join(f"{metrics[column]:>14.3f}" for column in columns))
+    # ru_maxrss is in kilobytes on Linux.
+    print(f"\nPeak process RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,100 +1,213 @@
 import streamlit as st
 import mysql.connector
-import numpy as np
-import ast
-from sentence_transformers import SentenceTransformer
+import os
 from candidate_display import *
 from candidate import Candidate
+from search_engine import SearchEngine, SECTIONS
+from ann_index import IVFIndex
+from embedding_store import EmbeddingStore
+from quantization import ScalarQuantizer, ProductQuantizer
+from query_cache import QueryEmbeddingCache
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from filter_index import FilterIndex
+from role_matching import match_role
+from model_registry import DEFAULT_MODEL, get_model
+from result_pages import RankedResults, SearchResultCache, query_hash
 from database_operations import *
 
-connection = create_connection()
+EMBEDDING_MODEL_NAME = DEFAULT_MODEL
+QUERY_CACHE_PATH = "index/query_cache.npz"
+
+
 # --- Utility Functions ---
 @st.cache_resource
-def load_embedding_model():
+def load_result_cache():
     """
-    Load and cache the SentenceTransformer model.
-    You can change the model name if desired.
+    Process-wide cache of ranked (and partly hydrated) results for repeated
+    searches, shared by all sessions. See SearchResultCache.stats() for hit rates.
     """
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    return model
+    return SearchResultCache()
 
 
-def get_query_embedding(query_text, model):
+@st.cache_resource
+def load_query_cache():
     """
-    Generate the embedding for the given query text.
+    Process-wide cache of query embeddings, shared by all sessions and
+    persisted to disk so restarts start warm.
     """
-    return model.encode(query_text)
+    return QueryEmbeddingCache(path=QUERY_CACHE_PATH)
+
+
+def get_query_embedding(query_text, model, model_name=EMBEDDING_MODEL_NAME):
+    """
+    Generate the embedding for the given query text, reusing a cached one for
+    repeated queries.
+    """
+    return load_query_cache().get_or_compute(query_text, model_name, model.encode)
+
 
 @st.cache_resource
-def load_resume_embeddings():
+def create_index_connection():
     """
-    Connects to the MySQL database and retrieves all resume embeddings.
-    Assumes each embedding is stored as a string representation of a Python list.
-    Returns a list of tuples: (candidate_id, embedding_vector)
+    Dedicated autocommit connection for index refreshes, so every refresh sees
+    rows committed by other sessions instead of a stale transaction snapshot.
     """
-    # Retrieve MySQL credentials from Streamlit secrets
-    db_config = {
-        'host': st.secrets["database"]["host"],
-        'user': st.secrets["database"]["user"],
-        'password': st.secrets["database"]["password"],
-        'database': st.secrets["database"]["database"]
-    }
+    return mysql.connector.connect(
+        host=st.secrets["database"]["host"],
+        user=st.secrets["database"]["user"],
+        password=st.secrets["database"]["password"],
+        database=st.secrets["database"]["database"],
+        autocommit=True
+    )
+
 
+# Exact scans are fast enough below this many chunks; above it an IVF index is
+# built (or loaded from ANN_INDEX_PATH) and used for searches.
+ANN_MIN_CHUNKS = 200000
+ANN_INDEX_PATH = "index/ivf_index.npz"
+# Memory-mapped embedding files shared by every server process on this host.
+EMBEDDING_STORE_PATH = "index/embeddings"
+# Set to "int8" or "pq" to shortlist candidates on compressed codes held in RAM
+# and re-score the shortlist against the full-precision store.
+SEARCH_QUANTIZER = None
+QUANTIZERS = {"int8": ScalarQuantizer, "pq": ProductQuantizer}
+# Two-stage search: shortlist this many candidates by centroid, then re-score
+# their chunks exactly (recall@10 ~0.98 in benchmark_search.py). None scans
+# every chunk.
+CENTROID_SHORTLIST = 1000
+# Exact scans are split into this many shards scored on parallel threads. Only
+# unfiltered exact scans are sharded, which the centroid shortlist replaces, so
+# this stays at 1 (no thread pool) unless CENTROID_SHORTLIST is None.
+SEARCH_SHARDS = 1
+# Hybrid retrieval: how many candidates each retriever contributes to the fusion,
+# and how much the BM25 ranking counts relative to the vector ranking.
+HYBRID_DEPTH = 100
+LEXICAL_WEIGHT = 0.5
+# How deep a query is ranked; pages are sliced from this ranking.
+RESULT_DEPTH = HYBRID_DEPTH
+AGGREGATION_LABELS = {
+    "max": "Best matching chunk",
+    "topk_mean": "Average of top 3 chunks",
+    "softmax": "Soft best matching chunk",
+    "mean": "Average of all chunks"
+}
+
+
+@st.cache_resource
+def load_search_engine():
+    """
+    Create the process-wide search engine on top of the shared embedding store.
+    New rows are pulled in by refresh_search_engine.
+    """
+    engine = SearchEngine(store=EmbeddingStore(EMBEDDING_STORE_PATH))
+    engine.set_shards(SEARCH_SHARDS)
+    return engine
+
+
+def refresh_search_engine():
+    """
+    Pull new and deleted resume embeddings into the cached engine.
+    Returns the engine, or None if the database could not be reached.
+    """
+    engine = load_search_engine()
     try:
-        conn = mysql.connector.connect(**db_config)
+        index_connection = create_index_connection()
+        index_connection.ping(reconnect=True)
+        engine.refresh(index_connection)
     except mysql.connector.Error as err:
-        st.error(f"Error connecting to MySQL: {err}")
-        return []
+        st.error(f"Error refreshing resume embeddings: {err}")
+        return None
+
+    if engine.index is None and len(engine) >= ANN_MIN_CHUNKS:
+        attach_ann_index(engine)
+    if SEARCH_QUANTIZER and engine.quantizer is None and len(engine) > 0:
+        with st.spinner("Compressing search index..."):
+            engine.attach_quantizer(QUANTIZERS[SEARCH_QUANTIZER]())
+    if CENTROID_SHORTLIST and engine.centroid_shortlist is None:
+        engine.use_centroids(CENTROID_SHORTLIST)
+    return engine
+
+
+@st.cache_resource
+def load_lexical_index():
+    """
+    Create the process-wide BM25 index over resume text, skills, experience and education.
+    """
+    return BM25Index()
+
 
-    cursor = conn.cursor()
+def refresh_lexical_index():
+    """
+    Pull new and deleted candidate text into the cached BM25 index.
+    Returns the index, or None if the database could not be reached.
+    """
+    lexical_index = load_lexical_index()
     try:
-        cursor.execute("SELECT candidate_id, embedding FROM ResumeEmbeddings")
+        index_connection = create_index_connection()
+        index_connection.ping(reconnect=True)
+        lexical_index.refresh(index_connection)
     except mysql.connector.Error as err:
-        st.error(f"Error executing query: {err}")
-        conn.close()
-        return []
-
-    rows = cursor.fetchall()
-    conn.close()
-
-    resume_data = []
-    for candidate_id, embedding_str in rows:
-        # Convert the stored string back to a list.
-        # Adjust this if your embeddings are stored in a different format.
-        try:
-            embedding = ast.literal_eval(embedding_str)
-        except Exception as e:
-            st.error(f"Error parsing embedding for candidate {candidate_id}: {e}")
-            continue
-        resume_data.append((candidate_id, np.array(embedding)))
-    return resume_data
+        st.error(f"Error refreshing keyword index: {err}")
+        return None
+    return lexical_index
 
 
-def cosine_similarity(vec1, vec2):
+@st.cache_resource
+def load_filter_index():
     """
-    Compute the cosine similarity between two vectors.
+    Create the process-wide location / skill / experience filter index.
     """
-    norm1 = np.linalg.norm(vec1)
-    norm2 = np.linalg.norm(vec2)
-    if norm1 == 0 or norm2 == 0:
-        return 0.0
-    return np.dot(vec1, vec2) / (norm1 * norm2)
+    return FilterIndex()
 
 
-def aggregate_candidate_scores(query_embedding, resume_data):
+def refresh_filter_index():
     """
-    For each candidate (who may have multiple resume chunks), compute a score.
-    Here we take the maximum similarity of any chunk as the candidate's score.
-    Returns a dict mapping candidate_id to score.
+    Pull new and deleted candidates into the cached filter index.
+    Returns the index, or None if the database could not be reached.
     """
-    candidate_scores = {}
-    for candidate_id, embedding in resume_data:
-        sim = cosine_similarity(query_embedding, embedding)
-        if candidate_id in candidate_scores:
-            candidate_scores[candidate_id] = max(candidate_scores[candidate_id], sim)
-        else:
-            candidate_scores[candidate_id] = sim
-    return candidate_scores
+    filter_index = load_filter_index()
+    try:
+        index_connection = create_index_connection()
+        index_connection.ping(reconnect=True)
+        filter_index.refresh(index_connection)
+    except mysql.connector.Error as err:
+        st.error(f"Error refreshing search filters: {err}")
+        return None
+    return filter_index
+
+
+def hybrid_search(engine, lexical_index, query_text, query_embedding, top_n, min_score=0.1,
+                  candidate_filter=None, aggregation="max", section_weights=None):
+    """
+    Rank candidates by reciprocal rank fusion of the vector ranking and the
+    BM25 keyword ranking, so exact terms like certifications or framework
+    versions are not lost. Falls back to vector-only ranking without an index.
+    candidate_filter limits both rankings to the allowed candidate ids.
+    section_weights restricts the vector ranking to the weighted resume sections.
+    """
+    vector_ranking = engine.search(query_embedding, top_n=HYBRID_DEPTH, min_score=min_score,
+                                   candidate_filter=candidate_filter, aggregation=aggregation,
+                                   section_weights=section_weights)
+    if lexical_index is None:
+        return vector_ranking[:top_n]
+    lexical_ranking = lexical_index.search(query_text, top_n=HYBRID_DEPTH, candidate_filter=candidate_filter)
+    fused = reciprocal_rank_fusion([vector_ranking, lexical_ranking], weights=[1.0, LEXICAL_WEIGHT])
+    return fused[:top_n]
+
+
+def attach_ann_index(engine):
+    """
+    Attach an IVF index to the engine, reusing the trained index on disk if there
+    is one, and save the result so the next process starts from it.
+    """
+    if os.path.exists(ANN_INDEX_PATH):
+        index = IVFIndex.load(ANN_INDEX_PATH)
+    else:
+        index = IVFIndex()
+    with st.spinner("Building approximate search index..."):
+        engine.attach_index(index)
+    os.makedirs(os.path.dirname(ANN_INDEX_PATH), exist_ok=True)
+    index.save(ANN_INDEX_PATH)
 
 
 def searchPage():
@@ -107,8 +220,10 @@ def searchPage():
     # Add a back button when viewing candidate details
     if st.session_state["selected_candidate_id"]:
         candidate_id = st.session_state["selected_candidate_id"]
+        connection = create_connection()
         candidate_details = fetch_candidate_details(connection, candidate_id)
-        display_full_candidate_details(candidate_details)
+        display_full_candidate_details(candidate_details, connection)
+        display_similar_candidates(candidate_id)
 
         if st.button("Back to Search"):
             st.session_state["selected_candidate_id"] = None
@@ -117,53 +232,177 @@ def searchPage():
     else:
         # Rest of your search interface code remains the same
         st.write("Enter a search query to find resumes that semantically match your input.")
-        query_text = st.text_area("Enter your search query:")
-        top_n = st.number_input("Number of top results to display:", min_value=1, step=1, value=5, max_value=10)
+        search_mode = st.radio("Search with:", ["Query", "Job description"], horizontal=True)
+        if search_mode == "Job description":
+            query_text = st.text_area("Paste the job description, one requirement per line:", height=200)
+            role_combine = st.selectbox("Combine requirement scores by:", ["mean", "min", "max"])
+        else:
+            query_text = st.text_area("Enter your search query:")
+            role_combine = None
+        section_weights = None
+        if search_mode == "Query":
+            with st.expander("Section weights"):
+                if st.checkbox("Search specific resume sections"):
+                    # A weight of 0 skips that section's vectors entirely.
+                    section_weights = {}
+                    for section in SECTIONS:
+                        weight = st.slider(f"{section.capitalize()} weight", 0.0, 2.0, 1.0, 0.25)
+                        if weight > 0:
+                            section_weights[section] = weight
+        page_size = st.number_input("Results per page:", min_value=1, step=1, value=5, max_value=10)
+        aggregation = st.selectbox(
+            "Score candidates by:", list(AGGREGATION_LABELS),
+            format_func=lambda mode: AGGREGATION_LABELS[mode]
+        )
+
+        with st.expander("Filters"):
+            location_filter = st.text_input("Location contains:")
+            skills_filter = st.text_input("Must-have skills (comma separated):")
+            min_years_filter = st.number_input("Minimum years of experience:", min_value=0, step=1, value=0)
 
         if st.button("Search"):
             if not query_text.strip():
                 st.warning("Please enter a non-empty query.")
                 return
 
-            model = load_embedding_model()
-            query_embedding = get_query_embedding(query_text, model)
-            resume_data = load_resume_embeddings()
+            engine = refresh_search_engine()
 
-            if not resume_data:
+            if not engine or len(engine) == 0:
                 st.error("No resume embeddings found in the database or an error occurred.")
                 return
 
-            candidate_scores = aggregate_candidate_scores(query_embedding, resume_data)
-            filtered_candidates = list(filter(
-                lambda x: x[1] >= 0.1,
-                candidate_scores.items()
-            ))
-            sorted_candidates = sorted(filtered_candidates, key=lambda x: x[1], reverse=True)
-            top_candidates = sorted_candidates[:top_n]
-
-            st.subheader("Top Matching Candidates (Similarity Score ≥ 0.7):")
-            if top_candidates:
-                for candidate_id, score in top_candidates:
-                    candidate_details = fetch_candidate_details(connection, candidate_id)
-
-                    candidate = Candidate(
-                        candidate_id=candidate_details['candidate_id'],
-                        name=candidate_details['name'],
-                        email=candidate_details['email'],
-                        phone=candidate_details['phone_number'],
-                        location=candidate_details['location'],
-                        education=candidate_details.get('education', 'No education'),
-                        experience=candidate_details.get('work_experience', 'No work experience'),
-                        skills=candidate_details.get('skills', 'No skills').split('; ') if candidate_details.get(
-                            'skills') else [],
-                        currentRole='Not specified',
-                        company='Not specified'
-                    )
-                    st.write(f"**Similarity Score:** {score:.2f}")
-                    display_candidate_info(candidate)
-
-                    if st.button(f"View Details: {candidate.candidate_id}", key=f"view_{candidate.candidate_id}"):
-                        st.session_state["selected_candidate_id"] = candidate.candidate_id
-                        st.rerun()
-            else:
-                st.info("No candidates found with similarity score ≥ 0.7. Try modifying your search query.")
\ No newline at end of file
+            skills = [skill.strip() for skill in skills_filter.split(",") if skill.strip()]
+            key = query_hash(query_text, mode=search_mode, combine=role_combine, aggregation=aggregation,
+                             location=location_filter.strip().lower(), skills=sorted(skills),
+                             min_years=min_years_filter, sections=section_weights, depth=RESULT_DEPTH)
+            result_cache = load_result_cache()
+            results = result_cache.get(key, engine.version)
+            if results is None:
+                results = rank_candidates(engine, search_mode, query_text, key, aggregation,
+                                          role_combine, location_filter, skills, min_years_filter,
+                                          section_weights)
+                if results is None:
+                    return
+                result_cache.put(results)
+            st.session_state["search_results"] = results
+            st.session_state["search_cursor"] = 0
+
+        # Rendered from session state so paging and "View Details" survive reruns.
+        if st.session_state.get("search_results") is not None:
+            display_results_page(st.session_state["search_results"], page_size)
+
+
+def display_similar_candidates(candidate_id, top_n=5):
+    """
+    List the candidates closest to the one being viewed, found from its stored
+    embeddings rather than by re-embedding its resume.
+    """
+    st.subheader("👥 Similar Candidates")
+    engine = refresh_search_engine()
+    similar = engine.similar_candidates(candidate_id, top_n=top_n) if engine else []
+    if not similar:
+        st.write("No similar candidates found.")
+        return
+    scores = dict(similar)
+    for candidate_details in fetch_candidates_details(create_connection(), list(scores)):
+        other_id = candidate_details['candidate_id']
+        st.write(f"**{candidate_details['name']}** ({candidate_details['location']}) — "
+                 f"Similarity: {scores[other_id]:.2f}")
+        if st.button(f"View Details: {other_id}", key=f"similar_{other_id}"):
+            st.session_state["selected_candidate_id"] = other_id
+            st.rerun()
+
+
+def rank_candidates(engine, search_mode, query_text, key, aggregation, role_combine,
+                    location_filter, skills, min_years, section_weights=None):
+    """
+    Compute the full ranking for a query, RESULT_DEPTH deep, so later pages are
+    sliced from it instead of rescored. Returns RankedResults, or None on error.
+    """
+    model = get_model(EMBEDDING_MODEL_NAME)
+    candidate_filter = None
+    if location_filter.strip() or skills or min_years:
+        filter_index = refresh_filter_index()
+        if filter_index is None:
+            return None
+        candidate_filter = filter_index.resolve(location_filter, skills, min_years)
+
+    if search_mode == "Job description":
+        ranking = match_role(engine, model, query_text, top_n=RESULT_DEPTH, combine=role_combine,
+                             cache=load_query_cache(), model_name=model.key,
+                             candidate_filter=candidate_filter, aggregation=aggregation)
+        return RankedResults(key, engine.version, ranking)
+
+    query_embedding = get_query_embedding(query_text, model, model.key)
+    lexical_index = refresh_lexical_index()
+    ranking = hybrid_search(engine, lexical_index, query_text, query_embedding, RESULT_DEPTH,
+                            candidate_filter=candidate_filter, aggregation=aggregation,
+                            section_weights=section_weights)
+    return RankedResults(key, engine.version, ranking, query_embedding, section_weights)
+
+
+def display_results_page(results, page_size):
+    """
+    Show one page of a cached ranking. Only the rows on the page are hydrated
+    from the database.
+    """
+    cursor = st.session_state.get("search_cursor", 0)
+    rows, next_cursor = results.page(cursor, page_size)
+
+    st.subheader("Top Matching Candidates (Similarity Score ≥ 0.7):")
+    if not rows:
+        st.info("No candidates found with similarity score ≥ 0.7. Try modifying your search query.")
+        return
+    st.caption(f"Showing {cursor + 1}–{cursor + len(rows)} of {len(results)}")
+
+    # Rows hydrated for an earlier view of this (possibly shared) ranking are reused.
+    missing = [candidate_id for candidate_id, _ in rows if candidate_id not in results.details]
+    if missing:
+        connection = create_connection()
+        # One round trip for every result instead of a query per candidate.
+        for candidate_details in fetch_candidates_details(connection, missing):
+            results.details[candidate_details['candidate_id']] = candidate_details
+        if results.query_embedding is not None:
+            # Show the resume chunk that matched each visible hit best.
+            best_chunks = load_search_engine().best_chunks(results.query_embedding, missing,
+                                                           results.section_weights)
+            chunk_texts = fetch_chunk_snippets(connection, list(best_chunks.values()))
+            results.snippets.update(
+                {candidate_id: chunk_texts.get(chunk_id) for candidate_id, chunk_id in best_chunks.items()}
+            )
+
+    snippets = results.snippets
+    for candidate_id, score in rows:
+        candidate_details = results.details.get(candidate_id)
+        if candidate_details is None:
+            continue
+        candidate = Candidate(
+            candidate_id=candidate_details['candidate_id'],
+            name=candidate_details['name'],
+            email=candidate_details['email'],
+            phone=candidate_details['phone_number'],
+            location=candidate_details['location'],
+            education=candidate_details.get('education', 'No education'),
+            experience=candidate_details.get('work_experience', 'No work experience'),
+            skills=candidate_details.get('skills', 'No skills').split('; ') if candidate_details.get(
+                'skills') else [],
+            currentRole='Not specified',
+            company='Not specified'
+        )
+        st.write(f"**Relevance Score:** {score:.2f}")
+        display_candidate_info(candidate)
+        if snippets.get(candidate.candidate_id):
+            st.caption(f"…{snippets[candidate.candidate_id]}…")
+
+        if st.button(f"View Details: {candidate.candidate_id}", key=f"view_{candidate.candidate_id}"):
+            st.session_state["selected_candidate_id"] = candidate.candidate_id
+            st.rerun()
+
+    previous_column, next_column = st.columns(2)
+    previous_cursor = RankedResults.previous_cursor(cursor, page_size)
+    if previous_cursor is not None and previous_column.button("Previous page"):
+        st.session_state["search_cursor"] = previous_cursor
+        st.rerun()
+    if next_cursor is not None and next_column.button("Next page"):
+        st.session_state["search_cursor"] = next_cursor
+        st.rerun()
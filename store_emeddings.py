@@ -1,54 +1,107 @@
 import struct
-from sentence_transformers import SentenceTransformer
 from database_operations import *
+from embedding_format import encode_embedding, compress_chunk_text
+from model_registry import get_model
+from embedding_batcher import EmbeddingBatcher
+from text_chunker import TextChunker, CHUNK_OVERLAP
 
-@st.cache_resource
-def create_model():
-    MODEL_NAME = "all-MiniLM-L6-v2"
-    mdl = SentenceTransformer(MODEL_NAME)
-    return mdl
 
+def chunk_text(text, max_tokens=None, overlap=CHUNK_OVERLAP):
+    """
+    Split text into chunks that fit the embedding model's window, measured with
+    its tokenizer. Returns (chunk, tokens) pairs; see TextChunker.
+    """
+    return TextChunker.for_model(get_model(), max_tokens, overlap).chunks(text)
 
-model = create_model()
 
+def resume_sections(education_data=(), work_experience_data=(), skills_data=()):
+    """
+    Turn the structured sections extracted by create_json into (section, text)
+    pairs to embed as separately typed vectors: one per role, one per
+    qualification and one for the whole skills list.
+    """
+    sections = []
+    for work in work_experience_data:
+        header = " at ".join(part for part in (work.get("position"), work.get("company_name")) if part)
+        text = ". ".join(part for part in (header, work.get("description")) if part)
+        if text:
+            sections.append(("experience", text))
+    for edu in education_data:
+        text = " ".join(part for part in (edu.get("degree"), edu.get("field_of_study")) if part)
+        if edu.get("institution_name"):
+            text += f" at {edu['institution_name']}"
+        if text.strip():
+            sections.append(("education", text.strip()))
+    skills = [skill["skill_name"] for skill in skills_data if skill.get("skill_name")]
+    if skills:
+        sections.append(("skills", "Skills: " + ", ".join(skills)))
+    return sections
 
-def chunk_text(text, max_tokens=512):
-    """Split text into chunks that fit within the token limit."""
-    sentences = text.split(". ")
-    chunks = []
-    current_chunk = ""
 
-    for sentence in sentences:
-        if len(current_chunk.split()) + len(sentence.split()) <= max_tokens:
-            current_chunk += sentence + ". "
-        else:
-            chunks.append(current_chunk.strip())
-            current_chunk = sentence + ". "
+def resume_chunks(resume_text, sections=()):
+    """
+    (section, chunk_index, chunk) triples for a resume and its typed sections,
+    and the token length of each chunk.
+    """
+    chunks, lengths = [], []
+    for section, text in [("resume", resume_text)] + list(sections):
+        # Long experience descriptions still have to fit the model's window.
+        start = sum(1 for name, _, _ in chunks if name == section)
+        for index, (chunk, tokens) in enumerate(chunk_text(text)):
+            chunks.append((section, start + index, chunk))
+            lengths.append(tokens)
+    return chunks, lengths
 
-    if current_chunk:
-        chunks.append(current_chunk.strip())
 
-    return chunks
+def embed_resumes(resumes, batch_size=64, max_batch_tokens=8192):
+    """
+    Chunk and embed many resumes together. resumes is a list of
+    (candidate_id, resume_text, sections); chunks of all of them are encoded in
+    length-bucketed batches. Returns {candidate_id: (chunks, embeddings)} and
+    the batcher's throughput stats.
+    """
+    batcher = EmbeddingBatcher(get_model(), batch_size, max_batch_tokens)
+    chunks = {}
+    for candidate_id, resume_text, sections in resumes:
+        chunks[candidate_id], lengths = resume_chunks(resume_text, sections)
+        batcher.add(candidate_id, [chunk for _, _, chunk in chunks[candidate_id]], lengths)
+    embeddings = batcher.run()
+    return {candidate_id: (chunks[candidate_id], embeddings[candidate_id]) for candidate_id in chunks
+            if candidate_id in embeddings}, batcher.stats
 
 
-def embed_resume(resume_text):
-    """Chunk and embed a resume."""
-    chunks = chunk_text(resume_text)
-    embeddings = model.encode(chunks, convert_to_tensor=False)
+def embed_resume(resume_text, sections=()):
+    """
+    Chunk and embed a resume plus its typed sections in one encode call.
+    Returns (section, chunk_index, chunk) triples and their embeddings.
+    """
+    chunks, _ = resume_chunks(resume_text, sections)
+    embeddings = get_model().encode([chunk for _, _, chunk in chunks])
     return chunks, embeddings
 
 
-def insert_embeddings(candidate_id, resume_text):
-    """Store resume embeddings and metadata in MySQL database."""
-    chunks, embeddings = embed_resume(resume_text)
+def insert_embeddings_many(cursor, resumes, batch_size=64, max_batch_tokens=8192):
+    """
+    Embed and store many resumes at once (bulk ingest). resumes is a list of
+    (candidate_id, resume_text, sections). Returns the batcher's stats; the
+    caller commits.
+    """
+    embedded, stats = embed_resumes(resumes, batch_size, max_batch_tokens)
+    query = """
+    INSERT INTO ResumeEmbeddings (candidate_id, section, chunk_index, embedding_blob, chunk_text)
+    VALUES (%s, %s, %s, %s, %s)
+    """
+    for candidate_id, (chunks, embeddings) in embedded.items():
+        rows = [
+            (candidate_id, section, chunk_index, encode_embedding(embedding), compress_chunk_text(chunk))
+            for (section, chunk_index, chunk), embedding in zip(chunks, embeddings)
+        ]
+        cursor.executemany(query, rows)
+    return stats
 
+
+def insert_embeddings(candidate_id, resume_text, sections=()):
+    """Store resume embeddings and metadata in MySQL database."""
     connection = create_connection()
     cursor = connection.cursor()
-
-    # Insert embeddings
-    query = """
-    INSERT INTO ResumeEmbeddings (candidate_id, embedding) VALUES (%s, %s)
-    """
-    for embedding in embeddings:
-        embedding_str = ",".join(map(str, embedding))  # Convert embedding array to string
-        cursor.execute(query, (candidate_id, embedding_str))
+    insert_embeddings_many(cursor, [(candidate_id, resume_text, sections)])
@@ -0,0 +1,147 @@
+import re
+
+# Default tokens shared by consecutive chunks, so a sentence cut at a chunk
+# boundary still has some context in the next chunk.
+CHUNK_OVERLAP = 32
+BULLET = re.compile(r"^\s*(?:[-*•·▪◦‣–]|\d{1,2}[.)])\s+")
+SENTENCE_END = re.compile(r"(?<=[.!?;])\s+")
+
+
+class TextChunker:
+    """
+    Split text into chunks that fit the embedding model's window, measured in
+    the model's own tokens.
+
+    Text is cut into segments at newlines, bullet markers and sentence ends,
+    and segments are packed greedily into chunks of at most max_tokens tokens
+    (the model's max_seq_length less its special tokens, so nothing is
+    truncated at encode time). Consecutive chunks repeat up to overlap tokens
+    of whole trailing segments. A segment longer than a chunk on its own is cut
+    at word boundaries using the tokenizer's offsets.
+
+    Each text is tokenized once, segment by segment in a single batch call;
+    chunk lengths are sums of segment lengths (exact for WordPiece models, which
+    split on whitespace first). chunks() returns those lengths with the text so
+    EmbeddingBatcher does not tokenize the chunks again.
+
+    Without a tokenizer, whitespace words stand in for tokens.
+    """
+
+    def __init__(self, tokenizer=None, max_tokens=254, overlap=CHUNK_OVERLAP, special_tokens=2):
+        if overlap >= max_tokens:
+            raise ValueError("Chunk overlap must be smaller than the chunk size")
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+        self.special_tokens = special_tokens
+
+    @classmethod
+    def for_model(cls, model, max_tokens=None, overlap=CHUNK_OVERLAP):
+        """
+        A chunker sized to model's tokenizer and maximum sequence length.
+        max_tokens can only lower the limit.
+        """
+        tokenizer = getattr(model, "tokenizer", None)
+        special_tokens = tokenizer.num_special_tokens_to_add() if tokenizer is not None else 2
+        limit = model.max_seq_length - special_tokens
+        if max_tokens is not None:
+            limit = min(limit, max_tokens)
+        return cls(tokenizer, limit, overlap, special_tokens)
+
+    def segments(self, text):
+        """
+        (segment, starts_line) pairs: one per sentence, with bullet markers
+        stripped and line breaks remembered so chunks keep the layout.
+        """
+        segments = []
+        for line in text.splitlines():
+            line = BULLET.sub("", line).strip()
+            for index, sentence in enumerate(SENTENCE_END.split(line)):
+                if sentence:
+                    segments.append((sentence, index == 0))
+        return segments
+
+    def measure(self, texts):
+        """
+        Token count of each text without special tokens, plus the character
+        offsets of its tokens where the tokenizer provides them (else None).
+        """
+        if not texts:
+            return []
+        if self.tokenizer is None:
+            return [(len(text.split()), None) for text in texts]
+        try:
+            encoded = self.tokenizer(texts, add_special_tokens=False, return_offsets_mapping=True)
+            return [(len(ids), offsets) for ids, offsets in zip(encoded["input_ids"], encoded["offset_mapping"])]
+        except NotImplementedError:
+            # Slow (pure Python) tokenizers have no offset mapping.
+            encoded = self.tokenizer(texts, add_special_tokens=False)
+            return [(len(ids), None) for ids in encoded["input_ids"]]
+
+    def split_long(self, segment, count, offsets):
+        """
+        Cut one over-long segment into (piece, tokens) parts of at most
+        max_tokens tokens, breaking between words.
+        """
+        if offsets is None:
+            words = segment.split()
+            # Without offsets, assume tokens are spread evenly over the words.
+            per_piece = max(int(self.max_tokens * len(words) / max(count, 1)), 1)
+            pieces = []
+            for i in range(0, len(words), per_piece):
+                piece = words[i:i + per_piece]
+                tokens = max(round(count * len(piece) / len(words)), 1)
+                pieces.append((" ".join(piece), min(tokens, self.max_tokens)))
+            return pieces
+        pieces, start = [], 0
+        while start < count:
+            end = min(start + self.max_tokens, count)
+            if end < count:
+                # Back off to a token that starts a word, so no word is split.
+                cut = end
+                while cut > start + 1 and offsets[cut][0] == offsets[cut - 1][1]:
+                    cut -= 1
+                if cut > start + 1:
+                    end = cut
+            pieces.append((segment[offsets[start][0]:offsets[end - 1][1]], end - start))
+            start = end
+        return pieces
+
+    def chunks(self, text):
+        """
+        [(chunk, tokens)] for text, where tokens is the chunk's length
+        including the model's special tokens.
+        """
+        segments = self.segments(text)
+        parts = []
+        for (segment, starts_line), (count, offsets) in zip(segments, self.measure([s for s, _ in segments])):
+            if count > self.max_tokens:
+                pieces = self.split_long(segment, count, offsets)
+                parts += [(piece, tokens, starts_line and i == 0) for i, (piece, tokens) in enumerate(pieces)]
+            elif count:
+                parts.append((segment, count, starts_line))
+
+        chunks, current, current_tokens = [], [], 0
+        for part in parts:
+            if current and current_tokens + part[1] > self.max_tokens:
+                chunks.append(self._join(current, current_tokens))
+                # Carry whole trailing segments, up to overlap tokens, into the next chunk.
+                carried, carried_tokens = [], 0
+                for previous in reversed(current):
+                    if carried_tokens + previous[1] > self.overlap or \
+                            carried_tokens + previous[1] + part[1] > self.max_tokens:
+                        break
+                    carried.insert(0, previous)
+                    carried_tokens += previous[1]
+                current, current_tokens = carried, carried_tokens
+            current.append(part)
+            current_tokens += part[1]
+        if current:
+            chunks.append(self._join(current, current_tokens))
+        return chunks
+
+    def _join(self, parts, tokens):
+        text = parts[0][0]
+        for segment, _, starts_line in parts[1:]:
+            text += ("\n" if starts_line else " ") + segment
+        return text, tokens + self.special_tokens